@@ -0,0 +1,281 @@
+"""
+Async Storage - non-blocking facade over the storage backend.
+Runs blocking file/database I/O on a dedicated, bounded thread pool so that
+fsync latency never stalls the asyncio event loop.
+
+Messages are written behind: add_message() queues the message and a single
+group commit per conversation writes everything queued within the
+write-behind window. Reads of a conversation wait for its queue first, and
+flush() is an explicit durability barrier that reports failed writes.
+
+wait_for_messages() is a long-poll: it parks the caller until the storage
+backend reports an append to the conversation (or a timeout expires).
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import logging
+
+from lock_registry import AsyncLockRegistry
+from models import Conversation, ConversationMetadata, Message
+from storage_manager import storage_manager
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncStorage:
+    """Async version of the StorageManager interface"""
+
+    def __init__(self, storage, max_workers: int = 4, write_behind_ms: float = 30):
+        """
+        Args:
+            storage: Storage backend (StorageManager or SQLiteStorageManager)
+            max_workers: Size of the dedicated I/O thread pool
+            write_behind_ms: Window for coalescing message writes (0 = write through)
+        """
+        self.storage = storage
+        self.max_workers = max_workers
+        self.write_behind = write_behind_ms / 1000
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="storage-io"
+        )
+        self._pending = {}  # conversation_id -> [Message] waiting for group commit
+        self._flush_tasks = {}  # conversation_id -> scheduled flush task
+        self._committing = set()  # conversation_ids whose batch is being written right now
+        self._write_locks = AsyncLockRegistry()  # per-conversation locks (keep batches in order)
+        self._failed = set()  # conversation_ids whose background commit failed
+        self._waiters = {}  # conversation_id -> set of futures woken on the next append
+        self._loop = None  # Event loop of the waiters (set on first wait)
+        storage.add_listener(self._on_messages_added)
+        logger.info(
+            f"AsyncStorage initialized with {max_workers} I/O workers, "
+            f"write-behind {write_behind_ms}ms"
+        )
+
+    async def _run(self, func, *args, **kwargs):
+        """Run a blocking storage call on the I/O executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    # ===== Write-behind =====
+
+    async def _delayed_flush(self, conversation_id: str) -> None:
+        """Group commit of a conversation's queue after the write-behind window"""
+        await asyncio.sleep(self.write_behind)
+        self._flush_tasks.pop(conversation_id, None)
+        await self._commit(conversation_id)
+
+    async def _commit(self, conversation_id: str) -> None:
+        """Write all queued messages of a conversation in one storage call"""
+        async with self._write_locks.hold(conversation_id):
+            batch = self._pending.pop(conversation_id, [])
+            if batch:
+                self._committing.add(conversation_id)
+                try:
+                    success = await self._run(
+                        self.storage.add_messages_to_conversation, conversation_id, batch
+                    )
+                finally:
+                    self._committing.discard(conversation_id)
+                if not success:
+                    logger.error(f"Group commit of {len(batch)} message(s) to {conversation_id} failed")
+                    self._failed.add(conversation_id)
+
+    async def _wait_written(self, conversation_id: Optional[str] = None) -> List[str]:
+        """
+        Wait until every message queued so far (for one conversation, or all
+        if None) is written. Failures are kept for the next flush() to report.
+
+        Returns:
+            The conversation_ids that were waited for
+        """
+        if conversation_id:
+            conversation_ids = [conversation_id]
+        else:
+            # Also wait for batches already taken by a running commit (they left
+            # _pending) and report background commits that failed earlier
+            conversation_ids = list(set(self._pending) | self._committing | self._failed)
+        for cid in conversation_ids:
+            await self._commit(cid)
+        return conversation_ids
+
+    async def flush(self, conversation_id: Optional[str] = None) -> bool:
+        """
+        Durability barrier: wait until every message queued so far (for one
+        conversation, or all if None) is written.
+
+        Returns:
+            False if any of those writes (including earlier background
+            commits not reported yet) failed
+        """
+        success = True
+        for cid in await self._wait_written(conversation_id):
+            if cid in self._failed:
+                success = False
+                self._failed.discard(cid)
+        return success
+
+    # ===== Long-poll =====
+
+    def _on_messages_added(self, conversation_id: str, messages: List[Message]) -> None:
+        """Storage listener (runs on an I/O thread): wake the conversation's waiters"""
+        loop = self._loop
+        if loop is not None and conversation_id in self._waiters:
+            loop.call_soon_threadsafe(self._wake, conversation_id)
+
+    def _wake(self, conversation_id: str) -> None:
+        for future in self._waiters.pop(conversation_id, ()):
+            if not future.done():
+                future.set_result(None)
+
+    async def wait_for_messages(
+        self,
+        conversation_id: str,
+        after: int,
+        limit: int = 100,
+        timeout: float = 25
+    ) -> Optional[List[Message]]:
+        """
+        Return messages with seq > after, waiting up to timeout seconds for one
+        to be appended if there are none yet.
+
+        Returns:
+            New messages (empty list on timeout), or None if the conversation does not exist
+        """
+        self._loop = asyncio.get_running_loop()
+        deadline = self._loop.time() + timeout
+
+        while True:
+            # Register before reading, so an append in between is not missed
+            future = self._loop.create_future()
+            self._waiters.setdefault(conversation_id, set()).add(future)
+            try:
+                messages = await self.load_messages(conversation_id, limit, after + 1)
+                remaining = deadline - self._loop.time()
+                if messages is None or messages or remaining <= 0:
+                    return messages
+                try:
+                    await asyncio.wait_for(future, remaining)
+                except asyncio.TimeoutError:
+                    return []
+            finally:
+                waiters = self._waiters.get(conversation_id)
+                if waiters is not None:
+                    waiters.discard(future)
+                    if not waiters:
+                        del self._waiters[conversation_id]
+
+    def waiter_count(self) -> int:
+        """Number of requests currently parked in wait_for_messages"""
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    # ===== Conversations =====
+
+    async def save_conversation(self, conversation: Conversation) -> bool:
+        await self._wait_written(conversation.id)
+        return await self._run(self.storage.save_conversation, conversation)
+
+    async def load_conversation(self, conversation_id: str) -> Optional[Conversation]:
+        await self._wait_written(conversation_id)
+        return await self._run(self.storage.load_conversation, conversation_id)
+
+    async def load_messages(
+        self,
+        conversation_id: str,
+        limit: int = 50,
+        offset: int = 0,
+        newest_first: bool = False
+    ) -> Optional[List[Message]]:
+        await self._wait_written(conversation_id)
+        return await self._run(
+            self.storage.load_messages, conversation_id, limit, offset, newest_first
+        )
+
+    async def find_message_seq(self, conversation_id: str, message_id: str) -> Optional[int]:
+        await self._wait_written(conversation_id)
+        return await self._run(self.storage.find_message_seq, conversation_id, message_id)
+
+    async def list_conversations(self) -> List[ConversationMetadata]:
+        await self._wait_written()
+        return await self._run(self.storage.list_conversations)
+
+    async def delete_conversation(self, conversation_id: str) -> bool:
+        await self._wait_written(conversation_id)
+        self._failed.discard(conversation_id)  # Nothing left to report for a deleted conversation
+        return await self._run(self.storage.delete_conversation, conversation_id)
+
+    async def add_message(self, conversation_id: str, message: Message) -> bool:
+        """
+        Queue a message for the next group commit of its conversation.
+
+        In write-behind mode True only means "queued" (the conversation
+        exists); the write itself can still fail. Call flush() and check its
+        result when the message must be durable before continuing.
+        """
+        if self.write_behind <= 0:
+            return await self._run(self.storage.add_message_to_conversation, conversation_id, message)
+
+        # Queue before the existence check (which awaits), so concurrent
+        # messages of a conversation keep their order
+        self._pending.setdefault(conversation_id, []).append(message)
+        if conversation_id not in self._flush_tasks:
+            self._flush_tasks[conversation_id] = asyncio.create_task(
+                self._delayed_flush(conversation_id)
+            )
+
+        if not await self.conversation_exists(conversation_id):
+            logger.error(f"Conversation {conversation_id} not found")
+            batch = self._pending.get(conversation_id)
+            if batch is not None:
+                batch[:] = [m for m in batch if m is not message]
+                if not batch:
+                    del self._pending[conversation_id]
+            return False
+        return True
+
+    async def conversation_exists(self, conversation_id: str) -> bool:
+        return await self._run(self.storage.conversation_exists, conversation_id)
+
+    def cache_stats(self) -> dict:
+        """In-memory counters only - safe to call on the event loop"""
+        return self.storage.cache_stats()
+
+    def lock_stats(self) -> dict:
+        """Number of live per-key locks (storage backend and write-behind)"""
+        return {
+            "storage": self.storage.lock_count(),
+            "write_behind": len(self._write_locks)
+        }
+
+    # ===== Party plans =====
+
+    async def save_plan(self, plan) -> bool:
+        return await self._run(self.storage.save_plan, plan)
+
+    async def load_plan(self, plan_id: str):
+        return await self._run(self.storage.load_plan, plan_id)
+
+    async def get_plan_by_conversation(self, conversation_id: str):
+        return await self._run(self.storage.get_plan_by_conversation, conversation_id)
+
+    async def delete_plan(self, plan_id: str) -> bool:
+        return await self._run(self.storage.delete_plan, plan_id)
+
+    # ===== Task lists =====
+
+    async def save_task_list(self, tasks: list, plan_id: str, conversation_id: str = "") -> bool:
+        return await self._run(self.storage.save_task_list, tasks, plan_id, conversation_id)
+
+    async def load_task_list(self, plan_id: str) -> Optional[list]:
+        return await self._run(self.storage.load_task_list, plan_id)
+
+
+# Global instance
+async_storage = AsyncStorage(
+    storage_manager,
+    max_workers=int(os.getenv("STORAGE_IO_WORKERS", "4")),
+    write_behind_ms=float(os.getenv("STORAGE_WRITE_BEHIND_MS", "30"))
+)
@@ -2,15 +2,17 @@
 Chat Service for handling chat conversations with LLM integration.
 Manages context, processes messages, and generates AI responses.
 """
+import os
 import logging
 import asyncio
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import List, Optional
 import uuid
 
 from llm_client import LLMClient
 from models import Message, MessageRole, Conversation, PartyPlan, PlanState
-from storage_manager import storage_manager
+from async_storage import async_storage
+from lock_registry import AsyncLockRegistry
 from party_planner import PartyPlanner
 
 logger = logging.getLogger(__name__)
@@ -18,17 +20,19 @@ logger = logging.getLogger(__name__)
 class ChatService:
     """Service for handling chat conversations with AI"""
     
-    def __init__(self, max_context_messages: int = 20):
+    def __init__(self, max_context_messages: int = 20, max_parallel_searches: int = 4):
         """
         Initialize chat service.
         
         Args:
             max_context_messages: Maximum number of messages to include in context window
+            max_parallel_searches: Category searches (venues, bakeries, ...) running at once
         """
         self.max_context_messages = max_context_messages
+        self.search_slots = asyncio.Semaphore(max_parallel_searches)
         self.party_planner = PartyPlanner()
         self.active_plans = {}  # conversation_id -> PartyPlan
-        self.conversation_locks = {}  # conversation_id -> asyncio.Lock
+        self.conversation_locks = AsyncLockRegistry()  # conversation_id -> asyncio.Lock (released when idle)
         self.system_prompt = """Jesteś pomocnym asystentem AI dla systemu umawiania wizyt i połączeń telefonicznych.
 Możesz pomóc użytkownikom w:
 - Umawianiu wizyt
@@ -45,7 +49,7 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
         Args:
             conversation_history: List of previous messages for context
         """
-        # Create new LLM client
+        # New chat session on the shared Gemini client (no connection setup per request)
         client = LLMClient()
         
         # Build context from conversation history
@@ -87,18 +91,12 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
         Returns:
             Tuple of (user_message, assistant_message)
         """
-        # Get or create lock for this conversation
-        if conversation_id not in self.conversation_locks:
-            self.conversation_locks[conversation_id] = asyncio.Lock()
-        
-        lock = self.conversation_locks[conversation_id]
-        
         # Acquire lock - only one request per conversation at a time
-        async with lock:
+        async with self.conversation_locks.hold(conversation_id):
             logger.info(f"🔒 Acquired lock for conversation {conversation_id}")
             try:
                 # Load conversation to get history
-                conversation = storage_manager.load_conversation(conversation_id)
+                conversation = await async_storage.load_conversation(conversation_id)
                 if not conversation:
                     raise ValueError(f"Conversation {conversation_id} not found")
                 
@@ -114,7 +112,7 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
                 
                 # Check if there's an active party plan for this conversation
                 logger.info(f"   🔍 Checking for existing party plan...")
-                plan = storage_manager.get_plan_by_conversation(conversation_id)
+                plan = await async_storage.get_plan_by_conversation(conversation_id)
                 logger.info(f"   Plan found: {plan is not None}, State: {plan.state if plan else 'N/A'}")
                 
                 if plan and plan.state != PlanState.COMPLETE:
@@ -211,7 +209,7 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
             updated_at=datetime.now()
         )
         
-        storage_manager.save_plan(plan)
+        await async_storage.save_plan(plan)
         logger.info(f"Created plan {plan.id} for conversation {conversation_id}")
         
         return response
@@ -284,7 +282,7 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
                     "should_continue_refresh": True  # ✅ Keep refreshing - more coming!
                 }
             )
-            storage_manager.add_message_to_conversation(conversation_id, progress_msg)
+            await async_storage.add_message(conversation_id, progress_msg)
             logger.info("✅ Progress message saved - user can see we're starting")
         
         # Update plan
@@ -294,7 +292,7 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
         plan.gathered_info = self.party_planner.gathered_info
         plan.updated_at = datetime.now()
         
-        storage_manager.save_plan(plan)
+        await async_storage.save_plan(plan)
         logger.info(f"Updated plan {plan.id}, new state: {plan.state}")
         
         # If we already saved messages directly (e.g., during GATHERING->SEARCHING transition),
@@ -310,54 +308,26 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
         conversation_id: str
     ) -> None:
         """
-        Execute venue search, bakery search, and task generation in background
+        Execute venue and bakery searches (concurrently), then task generation in background
         This prevents blocking the request handler for 30-60 seconds
         """
         try:
-            logger.info("🔄 Background task: Starting venue search...")
-            
-            # Step 1: Venue search
-            try:
-                venue_response = await self.party_planner.search_venues_only()
-            except Exception as e:
-                logger.error(f"❌ Venue search failed: {e}", exc_info=True)
-                venue_response = f"❌ Nie udało się wyszukać lokali (błąd: {str(e)})\n\nKontynuuję wyszukiwanie cukierni..."
-            
-            venue_msg = Message(
-                id=str(uuid.uuid4()),
-                conversation_id=conversation_id,
-                role=MessageRole.ASSISTANT,
-                content=venue_response,
-                timestamp=datetime.now(),
-                metadata={
-                    "step": "venue_search",
-                    "should_continue_refresh": True
-                }
-            )
-            storage_manager.add_message_to_conversation(conversation_id, venue_msg)
-            logger.info("✅ Venue search message saved")
-            
-            # Step 2: Bakery search
-            logger.info("🔄 Background task: Starting bakery search...")
-            try:
-                bakery_response = await self.party_planner.search_bakeries_only()
-            except Exception as e:
-                logger.error(f"❌ Bakery search failed: {e}", exc_info=True)
-                bakery_response = f"❌ Nie udało się wyszukać cukierni (błąd: {str(e)})\n\nKontynuuję generowanie zadań..."
-            
-            bakery_msg = Message(
-                id=str(uuid.uuid4()),
-                conversation_id=conversation_id,
-                role=MessageRole.ASSISTANT,
-                content=bakery_response,
-                timestamp=datetime.now(),
-                metadata={
-                    "step": "bakery_search",
-                    "should_continue_refresh": True
-                }
+            # Steps 1-2: Category searches run concurrently - each result is saved as soon as it is ready
+            logger.info("🔄 Background task: Starting venue and bakery search...")
+            await asyncio.gather(
+                self._run_search_step(
+                    conversation_id,
+                    "venue_search",
+                    self.party_planner.search_venues_only,
+                    "❌ Nie udało się wyszukać lokali (błąd: {error})"
+                ),
+                self._run_search_step(
+                    conversation_id,
+                    "bakery_search",
+                    self.party_planner.search_bakeries_only,
+                    "❌ Nie udało się wyszukać cukierni (błąd: {error})"
+                )
             )
-            storage_manager.add_message_to_conversation(conversation_id, bakery_msg)
-            logger.info("✅ Bakery search message saved")
             
             # Step 3: Task generation
             logger.info("🔄 Background task: Generating tasks...")
@@ -379,7 +349,7 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
                         "should_continue_refresh": True
                     }
                 )
-                storage_manager.add_message_to_conversation(conversation_id, task_msg)
+                await async_storage.add_message(conversation_id, task_msg)
                 logger.info("✅ Task generation message saved")
             
             # Step 4: Start voice agent if tasks were generated
@@ -398,7 +368,7 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
                     #         "should_continue_refresh": True
                     #     }
                     # )
-                    # storage_manager.add_message_to_conversation(conversation_id, voice_starting_msg)
+                    # await async_storage.add_message(conversation_id, voice_starting_msg)
                     
                     # Execute voice agent
                     await self._execute_voice_agent_in_background(conversation_id, plan_id)
@@ -417,7 +387,45 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
                     "should_continue_refresh": False
                 }
             )
-            storage_manager.add_message_to_conversation(conversation_id, error_msg)
+            await async_storage.add_message(conversation_id, error_msg)
+    
+    async def _run_search_step(
+        self,
+        conversation_id: str,
+        step: str,
+        search,
+        error_template: str
+    ) -> None:
+        """
+        Run one category search (bounded by search_slots) and save its result as a message
+        
+        Args:
+            conversation_id: Conversation to post the result to
+            step: Step name stored in the message metadata
+            search: Coroutine function returning the formatted result text
+            error_template: Message on failure ({error} is replaced)
+        """
+        async with self.search_slots:
+            logger.info(f"🔄 Background task: {step} started")
+            try:
+                response = await search()
+            except Exception as e:
+                logger.error(f"❌ {step} failed: {e}", exc_info=True)
+                response = error_template.format(error=str(e))
+        
+        message = Message(
+            id=str(uuid.uuid4()),
+            conversation_id=conversation_id,
+            role=MessageRole.ASSISTANT,
+            content=response,
+            timestamp=datetime.now(),
+            metadata={
+                "step": step,
+                "should_continue_refresh": True
+            }
+        )
+        await async_storage.add_message(conversation_id, message)
+        logger.info(f"✅ {step} message saved")
     
     async def _execute_voice_agent_in_background(
         self,
@@ -442,7 +450,7 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
                     "should_continue_refresh": False  # ✅ NOW we stop - all done!
                 }
             )
-            storage_manager.add_message_to_conversation(conversation_id, completion_msg)
+            await async_storage.add_message(conversation_id, completion_msg)
             logger.info("✅ Voice agent completed - completion message saved")
             
         except Exception as e:
@@ -459,7 +467,7 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
                     "should_continue_refresh": False
                 }
             )
-            storage_manager.add_message_to_conversation(conversation_id, error_msg)
+            await async_storage.add_message(conversation_id, error_msg)
     
     async def execute_voice_agent_tasks(
         self,
@@ -486,7 +494,7 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
         
         # Pobierz tasks z storage
         logger.info(f"📂 Loading tasks from storage for plan_id: {plan_id}")
-        tasks = storage_manager.load_task_list(plan_id)
+        tasks = await async_storage.load_task_list(plan_id)
         
         if not tasks:
             logger.error(f"❌ No tasks found for plan_id: {plan_id}")
@@ -522,7 +530,7 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
             #     }
             # )
             # logger.info(f"💾 Saving intro message to conversation...")
-            # storage_manager.add_message_to_conversation(conversation_id, intro_msg)
+            # await async_storage.add_message(conversation_id, intro_msg)
             # logger.info(f"✅ Intro message saved")
             
             # Try each place until success
@@ -575,7 +583,7 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
                     }
                 )
                 logger.info(f"   💾 Saving 'calling' message...")
-                storage_manager.add_message_to_conversation(conversation_id, calling_msg)
+                await async_storage.add_message(conversation_id, calling_msg)
                 logger.info(f"   ✅ 'Calling' message saved")
                 
                 # 2. ✅ ASYNC: Initiate call
@@ -609,7 +617,7 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
                             "should_continue_refresh": True  # ✅ Trying next place!
                         }
                     )
-                    storage_manager.add_message_to_conversation(conversation_id, error_msg)
+                    await async_storage.add_message(conversation_id, error_msg)
                     place.phone = original_phone  # Restore
                     continue  # Try next place
                 
@@ -641,7 +649,7 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
                             "should_continue_refresh": True  # ✅ Keep refreshing - trying next place!
                         }
                     )
-                    storage_manager.add_message_to_conversation(conversation_id, error_msg)
+                    await async_storage.add_message(conversation_id, error_msg)
                     place.phone = original_phone  # Restore
                     continue  # Try next place
                 
@@ -686,7 +694,7 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
                             "should_continue_refresh": True  # ✅ Keep refreshing - analysis coming!
                         }
                     )
-                    storage_manager.add_message_to_conversation(conversation_id, transcript_msg)
+                    await async_storage.add_message(conversation_id, transcript_msg)
                     
                 except Exception as e:
                     logger.error(f"❌ Error formatting transcript: {e}")
@@ -705,7 +713,7 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
                             "should_continue_refresh": True  # ✅ Keep refreshing - trying next place!
                         }
                     )
-                    storage_manager.add_message_to_conversation(conversation_id, error_msg)
+                    await async_storage.add_message(conversation_id, error_msg)
                     place.phone = original_phone  # Restore
                     continue  # Try next place
                 
@@ -761,7 +769,7 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
                             "should_continue_refresh": True  # ✅ More tasks coming!
                         }
                     )
-                    storage_manager.add_message_to_conversation(conversation_id, success_msg)
+                    await async_storage.add_message(conversation_id, success_msg)
                     
                     # Restore original phone
                     place.phone = original_phone
@@ -794,7 +802,7 @@ Odpowiadaj w sposób profesjonalny, przyjazny i konkretny."""
                             "should_continue_refresh": True  # ✅ Trying next place!
                         }
                     )
-                    storage_manager.add_message_to_conversation(conversation_id, retry_msg)
+                    await async_storage.add_message(conversation_id, retry_msg)
                     
                     # Restore original phone
                     place.phone = original_phone
@@ -828,7 +836,7 @@ Czy mogę Ci w czymś jeszcze pomóc?""",
             timestamp=datetime.now(),
             metadata={"step": "execution_complete", "total_tasks": len(tasks)}
         )
-        storage_manager.add_message_to_conversation(conversation_id, final_msg)
+        await async_storage.add_message(conversation_id, final_msg)
         
         logger.info(f"✅ All {len(tasks)} tasks executed!")
     
@@ -853,7 +861,7 @@ Czy mogę Ci w czymś jeszcze pomóc?""",
             
             # ✅ ASYNC: Generate response
             start_time = datetime.now()
-            response = await client.send_async(user_message)
+            response = await client.send_async(user_message, stream=True)
             processing_time = (datetime.now() - start_time).total_seconds()
             
             logger.info(f"Generated AI response in {processing_time:.2f}s")
@@ -880,7 +888,7 @@ Czy mogę Ci w czymś jeszcze pomóc?""",
             else:
                 return f"Przepraszam, wystąpił błąd: {error_msg[:100]}"
     
-    def create_conversation(self, initial_message: Optional[str] = None) -> Conversation:
+    async def create_conversation(self, initial_message: Optional[str] = None) -> Conversation:
         """
         Create a new conversation.
         
@@ -913,12 +921,12 @@ Czy mogę Ci w czymś jeszcze pomóc?""",
         )
         
         # Save to disk
-        storage_manager.save_conversation(conversation)
+        await async_storage.save_conversation(conversation)
         
         logger.info(f"Created new conversation {conversation_id}")
         return conversation
 
 
 # Global instance
-chat_service = ChatService()
+chat_service = ChatService(max_parallel_searches=int(os.getenv("SEARCH_CONCURRENCY", "4")))
 
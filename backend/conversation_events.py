@@ -0,0 +1,83 @@
+"""
+Conversation Events - in-process pub/sub of persisted conversation messages.
+
+The storage backend reports every append; each message is fanned out from
+memory to all subscribers of its conversation (e.g. SSE connections from
+several browser tabs), so watching a conversation costs no disk reads.
+"""
+import asyncio
+from typing import List, Optional
+import logging
+
+from models import Message
+from async_storage import async_storage
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationEvents:
+    """Fan-out of new messages to per-subscriber queues"""
+
+    def __init__(self, storage, max_queue: int = 256):
+        """
+        Args:
+            storage: Storage backend to listen on (add_listener interface)
+            max_queue: Events buffered per subscriber before it is dropped
+        """
+        self.max_queue = max_queue
+        self._subscribers = {}  # conversation_id -> set of asyncio.Queue
+        self._loop = None  # Event loop of the subscribers (set on first subscribe)
+        storage.add_listener(self._on_messages_added)
+
+    def _on_messages_added(self, conversation_id: str, messages: List[Message]) -> None:
+        """Storage listener (runs on an I/O thread): hand over to the event loop"""
+        loop = self._loop
+        if loop is not None and conversation_id in self._subscribers:
+            # Copy - the writer still owns the Message objects
+            snapshot = [message.model_copy() for message in messages]
+            loop.call_soon_threadsafe(self.publish, conversation_id, snapshot)
+
+    def publish(self, conversation_id: str, messages: List[Message]) -> None:
+        """Deliver messages to every subscriber of the conversation (event loop only)"""
+        for queue in list(self._subscribers.get(conversation_id, ())):
+            for message in messages:
+                try:
+                    queue.put_nowait(message)
+                except asyncio.QueueFull:
+                    # Slow consumer: drop it, it can reconnect and replay from storage
+                    logger.warning(f"Dropping slow subscriber of conversation {conversation_id}")
+                    self.unsubscribe(conversation_id, queue)
+                    break
+
+    def subscribe(self, conversation_id: str) -> asyncio.Queue:
+        """Start receiving the conversation's new messages (call unsubscribe when done)"""
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.max_queue)
+        self._subscribers.setdefault(conversation_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, conversation_id: str, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(conversation_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[conversation_id]
+
+    def is_subscribed(self, conversation_id: str, queue: asyncio.Queue) -> bool:
+        """False once a subscriber was dropped for falling behind"""
+        return queue in self._subscribers.get(conversation_id, ())
+
+    async def next_message(self, queue: asyncio.Queue, timeout: float) -> Optional[Message]:
+        """Next message for a subscriber, or None if nothing arrived within timeout"""
+        try:
+            return await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def subscriber_count(self) -> int:
+        """Number of open subscriptions across all conversations"""
+        return sum(len(queues) for queues in self._subscribers.values())
+
+
+# Global instance
+conversation_events = ConversationEvents(async_storage.storage)
@@ -7,7 +7,7 @@ from pydantic import BaseModel
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
-from llm_client import LLMClient
+from llm_client import LLMCallError, LLMClient
 
 load_dotenv()
 
@@ -55,7 +55,7 @@ Gdy zebrano WSZYSTKO, zwróć JSON:
         except Exception as e:
             # Handle API errors (429, timeouts, etc)
             error_msg = str(e)
-            if "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg or "quota" in error_msg.lower():
+            if (isinstance(e, LLMCallError) and e.throttled) or "quota" in error_msg.lower():
                 return {
                     "type": "chat",
                     "text": "❌ Przepraszam, API Gemini przekroczyło limit requestów. Spróbuj za chwilę lub użyj innego klucza API."
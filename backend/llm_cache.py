@@ -0,0 +1,230 @@
+"""
+LLM Cache - TTL-bounded cache of stateless LLM responses.
+
+Entries are keyed by llm_client.prompt_key (hash of model, system instruction
+and prompt) and expire after the TTL of their prompt kind. The in-memory LRU
+tier is bounded by entry count and total size; the optional SQLite tier
+(LLM_CACHE=sqlite) survives restarts and is shared by worker processes.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Seconds a response stays valid, per prompt kind
+DEFAULT_TTLS = {
+    "venue_search": 6 * 3600,       # Search results (venues open/close rarely)
+    "venue_parse": 7 * 24 * 3600,   # Parsing is a pure function of the search text
+    "call_analysis": 24 * 3600,     # Transcript analysis is a pure function of the transcript
+}
+DEFAULT_TTL = 3600  # Kinds without their own TTL
+
+
+class LLMResponseCache:
+    """Two-tier (memory LRU + optional SQLite) response cache"""
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        max_bytes: int = 8 * 1024 * 1024,
+        ttls: Optional[Dict[str, float]] = None,
+        db_path: Optional[str] = None,
+        max_disk_entries: int = 10000
+    ):
+        """
+        Args:
+            max_entries: Responses kept in memory
+            max_bytes: Total size of responses kept in memory
+            ttls: TTL in seconds per prompt kind (merged over DEFAULT_TTLS)
+            db_path: SQLite file of the disk tier, None = memory only
+            max_disk_entries: Rows kept on disk (oldest evicted first)
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.db_path = db_path
+        self.max_disk_entries = max_disk_entries
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (value, expires_at)
+        self._memory_bytes = 0
+        self._local = threading.local()
+        self._writes_since_prune = 0
+        self._counters = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        if self.db_path:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            conn = self._connect()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, kind TEXT NOT NULL, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache(created_at)")
+            conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get the connection for the current thread (created on first use)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def ttl_for(self, kind: str) -> float:
+        return self.ttls.get(kind, DEFAULT_TTL)
+
+    # ===== Memory tier =====
+
+    def _remember(self, key: str, value: str, expires_at: float) -> None:
+        """Put into the memory LRU and evict down to the limits (caller holds the lock)"""
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old[0])
+        self._memory[key] = (value, expires_at)
+        self._memory_bytes += len(value)
+
+        while self._memory and (len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes):
+            _, (evicted, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._counters["evictions"] += 1
+
+    def _get_memory(self, key: str, now: float) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._memory[key]
+                self._memory_bytes -= len(value)
+                return None
+            self._memory.move_to_end(key)
+            self._counters["hits"] += 1
+            return value
+
+    # ===== Public API =====
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached response for key, or None if missing/expired"""
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is not None:
+            return value
+
+        if self.db_path:
+            row = self._connect().execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?",
+                (key, now)
+            ).fetchone()
+            if row is not None:
+                with self._lock:
+                    self._remember(key, row[0], row[1])
+                    self._counters["disk_hits"] += 1
+                return row[0]
+
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def set(self, key: str, kind: str, value: str) -> None:
+        """Store a response for the TTL of its prompt kind"""
+        now = time.time()
+        expires_at = now + self.ttl_for(kind)
+        with self._lock:
+            self._remember(key, value, expires_at)
+            self._counters["stores"] += 1
+            self._writes_since_prune += 1
+            prune = self._writes_since_prune >= 100
+            if prune:
+                self._writes_since_prune = 0
+
+        if self.db_path:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, kind, value, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, kind, value, now, expires_at)
+            )
+            if prune:
+                self._prune_disk(conn, now)
+            conn.commit()
+
+    def _prune_disk(self, conn: sqlite3.Connection, now: float) -> None:
+        """Drop expired rows, then the oldest rows above max_disk_entries"""
+        conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+        conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            "SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        )
+
+    async def get_async(self, key: str) -> Optional[str]:
+        """get() that keeps disk reads off the event loop"""
+        if not self.db_path:
+            return self.get(key)
+        value = self._get_memory(key, time.time())
+        if value is not None:
+            return value
+        return await asyncio.to_thread(self.get, key)
+
+    async def set_async(self, key: str, kind: str, value: str) -> None:
+        if not self.db_path:
+            self.set(key, kind, value)
+        else:
+            await asyncio.to_thread(self.set, key, kind, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        if self.db_path:
+            conn = self._connect()
+            conn.execute("DELETE FROM llm_cache")
+            conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(
+                self._counters,
+                entries=len(self._memory),
+                bytes=self._memory_bytes,
+                disk=bool(self.db_path)
+            )
+
+
+def create_llm_cache() -> Optional[LLMResponseCache]:
+    """
+    Create the response cache selected by LLM_CACHE: "memory" (default),
+    "sqlite" (memory + LLM_CACHE_PATH on disk) or "off". TTLs can be
+    overridden per prompt kind with LLM_CACHE_TTL_<KIND> (seconds).
+    """
+    mode = os.getenv("LLM_CACHE", "memory").lower()
+    if mode == "off":
+        return None
+    if mode not in ("memory", "sqlite"):
+        raise ValueError(f"Unknown LLM_CACHE: {mode}")
+
+    ttls = {}
+    for kind in DEFAULT_TTLS:
+        value = os.getenv(f"LLM_CACHE_TTL_{kind.upper()}")
+        if value:
+            ttls[kind] = float(value)
+
+    return LLMResponseCache(
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512")),
+        ttls=ttls,
+        db_path=os.getenv("LLM_CACHE_PATH", "database/llm_cache.db") if mode == "sqlite" else None
+    )
+
+
+# Global instance (None when disabled)
+llm_cache = create_llm_cache()
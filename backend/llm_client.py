@@ -1,63 +1,255 @@
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
-from typing import Generator, List
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import AsyncGenerator, Callable, Generator, List, Optional
 import os
 import asyncio
+import hashlib
+import threading
+import time
+import logging
+
+from llm_scheduler import llm_scheduler, INTERACTIVE
+from llm_rate_limit import gemini_rate_limiter, gemini_retry_policy, is_throttle_error, retry_delay_from_error
+from singleflight import SingleFlight
+from llm_cache import llm_cache
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Receiver of response chunks for the current request (set by the streaming chat
+# endpoint). Called on the event loop; only send_async(..., stream=True) feeds it.
+token_sink: ContextVar[Optional[Callable[[str], None]]] = ContextVar("token_sink", default=None)
+
+# "native": send_async uses the SDK's async client (client.aio) - no thread per call
+# "thread": run the blocking client in the default thread pool (fallback)
+LLM_ASYNC_MODE = os.getenv("LLM_ASYNC_MODE", "native").lower()
+
+class GeminiClientFactory:
+    """
+    Process-wide genai.Client and prebuilt GenerateContentConfigs.
+    
+    LLMClient instances are lightweight per-request chat sessions on top of
+    these, so the HTTP connection pool (and its TLS connections) is reused
+    across LLM calls instead of being set up again for every request.
+    """
+
+    def __init__(self, max_configs: int = 64):
+        """
+        Args:
+            max_configs: Distinct system instructions whose config is kept (LRU)
+        """
+        self.max_configs = max_configs
+        self._lock = threading.Lock()
+        self._client = None
+        self._configs = OrderedDict()  # (system_instruction, response_schema) -> GenerateContentConfig
+
+    def get_client(self) -> genai.Client:
+        """The shared client (created on first use)"""
+        with self._lock:
+            if self._client is None:
+                api_key = os.getenv("GEMINI_API_KEY")
+                if not api_key:
+                    raise ValueError("GEMINI_API_KEY not found in environment variables.")
+                self._client = genai.Client(api_key=api_key)
+            return self._client
+
+    def get_config(
+        self,
+        system_instruction: Optional[str] = None,
+        response_schema=None
+    ) -> types.GenerateContentConfig:
+        """
+        Shared config with Google Search grounding and the given system instruction.
+        Configs are shared between sessions - treat them as read-only.
+        
+        Args:
+            system_instruction: Optional system instruction for the model
+            response_schema: Optional schema (e.g. list[Venue]) - the model then
+                             answers with JSON matching it
+        """
+        cache_key = (system_instruction, response_schema)
+        with self._lock:
+            config = self._configs.get(cache_key)
+            if config is not None:
+                self._configs.move_to_end(cache_key)
+                return config
+
+            grounding_tool = types.Tool(
+                google_search=types.GoogleSearch()
+            )
+            options = {"tools": [grounding_tool]}
+
+            # Create config with or without system instruction
+            if system_instruction:
+                options["system_instruction"] = system_instruction
+            if response_schema is not None:
+                options["response_mime_type"] = "application/json"
+                options["response_schema"] = response_schema
+            config = types.GenerateContentConfig(**options)
+
+            self._configs[cache_key] = config
+            if len(self._configs) > self.max_configs:
+                self._configs.popitem(last=False)
+            return config
+
+    def reset(self) -> None:
+        """Drop the shared client and configs (e.g. after rotating GEMINI_API_KEY)"""
+        with self._lock:
+            self._client = None
+            self._configs.clear()
+
+
+# Global instances
+gemini_clients = GeminiClientFactory()
+stateless_calls = SingleFlight()  # Coalesces identical in-flight send_stateless_async() prompts
+
+
+def prompt_key(model: str, system_instruction: Optional[str], prompt: str, response_schema=None) -> str:
+    """Identity of a stateless prompt: hash of (model, system instruction, prompt[, schema])"""
+    digest = hashlib.sha256()
+    parts = [model, system_instruction or "", prompt]
+    if response_schema is not None:
+        parts.append(repr(response_schema))
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LLMCallError(Exception):
+    """An LLM call failed (after any retries); str() is the API error message"""
+
+    def __init__(self, error: Exception):
+        super().__init__(str(error))
+        self.error = error
+        self.throttled = is_throttle_error(error)
+
+
+def _in_event_loop() -> bool:
+    """True when called on a thread that is running an asyncio event loop"""
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
 class LLMClient:
-    def __init__(self, model: str = "gemini-2.5-flash", system_instruction: str = None):
+    def __init__(
+        self,
+        model: str = "gemini-2.5-flash",
+        system_instruction: str = None,
+        lane: str = INTERACTIVE,
+        response_schema=None
+    ):
         """
-        Initialize the Gemini Client with a chat session.
+        Initialize a chat session on the shared Gemini client.
+        
+        Cheap to construct: the HTTP client and config come from gemini_clients,
+        only the chat session (conversation history) is per instance.
         
         Args:
             model: The model to use. Default is gemini-2.5-flash.
             system_instruction: Optional system instruction for the model.
+            lane: llm_scheduler priority lane of send_async calls
+                  ("interactive" or "background")
+            response_schema: Optional schema for JSON (structured) responses
         """
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables.")
-            
-        self.client = genai.Client(api_key=api_key)
+        self.client = gemini_clients.get_client()
         self.model = model
         self.system_instruction = system_instruction
-
-        grounding_tool = types.Tool(
-            google_search=types.GoogleSearch()
-        )
-
-        # Create config with or without system instruction
-        if self.system_instruction:
-            self.config = types.GenerateContentConfig(
-                tools=[grounding_tool],
-                system_instruction=self.system_instruction
-            )
-        else:
-            self.config = types.GenerateContentConfig(
-                tools=[grounding_tool]
-            )
-
+        self.lane = lane
+        self.response_schema = response_schema
+        self.config = gemini_clients.get_config(system_instruction, response_schema)
         
         # Initialize the chat session immediately
         self.chat_session = self.client.chats.create(model=self.model, config=self.config)
+        # Async (client.aio) session - created on the first native async call.
+        # Only one of the two sessions is active; the history is handed over on switch.
+        self.async_chat_session = None
+        self.native_async = LLM_ASYNC_MODE != "thread" and getattr(self.client, "aio", None) is not None
         
+    def _get_sync_session(self):
+        """Sync chat session, taking over the history of the async one if it was used"""
+        if self.async_chat_session is not None:
+            self.chat_session = self.client.chats.create(
+                model=self.model,
+                config=self.config,
+                history=self.async_chat_session.get_history()
+            )
+            self.async_chat_session = None
+        return self.chat_session
+
+    def _get_async_session(self):
+        """Async chat session, taking over the history of the sync one"""
+        if self.async_chat_session is None:
+            self.async_chat_session = self.client.aio.chats.create(
+                model=self.model,
+                config=self.config,
+                history=self.chat_session.get_history()
+            )
+        return self.async_chat_session
+
+    def _retry_delay(self, error: Exception, attempt: int, waited: float) -> Optional[float]:
+        """Report a failed attempt to the rate limiter; seconds to wait before retrying or None"""
+        if is_throttle_error(error):
+            gemini_rate_limiter.on_throttled(retry_delay_from_error(error))
+        delay = gemini_retry_policy.next_delay(error, attempt, waited)
+        if delay is not None:
+            logger.warning(f"Gemini call failed ({str(error)[:80]}), retry {attempt + 1} in {delay:.1f}s")
+        return delay
+
+    def _stream_once(self, message: str) -> Generator[str, None, None]:
+        """One attempt on the sync chat session (no rate limiting or retries)"""
+        response_stream = self._get_sync_session().send_message_stream(message)
+        for chunk in response_stream:
+            if chunk.text:
+                yield chunk.text
+
+    async def _stream_once_async(self, message: str) -> AsyncGenerator[str, None]:
+        """One attempt on the native async session - waiting for the model does not hold a thread"""
+        response_stream = await self._get_async_session().send_message_stream(message)
+        async for chunk in response_stream:
+            if chunk.text:
+                yield chunk.text
+
     def send_message(self, message: str) -> Generator[str, None, None]:
         """
         Sends a message to the active chat session and streams the response.
+        Rate limited; throttled calls are retried until the first chunk arrives.
+        Called from an event loop thread, it never sleeps (no throttling wait,
+        no retries) - use send_async() there.
         
         Yields:
             String chunks of the generated response.
-        """
-        try:
-            response_stream = self.chat_session.send_message_stream(message)
             
-            for chunk in response_stream:
-                if chunk.text:
-                    yield chunk.text
-                    
-        except Exception as e:
-            yield f"\n[Error: {str(e)}]"
+        Raises:
+            LLMCallError: The call failed and was not (or no longer) retried
+        """
+        on_loop = _in_event_loop()
+        if on_loop:
+            logger.warning("Sync LLM call on the event loop thread - rate limit wait and retries skipped")
+        attempt, waited = 0, 0.0
+        while True:
+            started = False
+            try:
+                if not on_loop:
+                    gemini_rate_limiter.acquire_blocking()
+                for chunk in self._stream_once(message):
+                    started = True
+                    yield chunk
+                gemini_rate_limiter.on_success()
+                return
+                        
+            except Exception as e:
+                delay = None if started or on_loop else self._retry_delay(e, attempt, waited)
+                if delay is None:
+                    raise LLMCallError(e) from e
+                attempt, waited = attempt + 1, waited + delay
+                time.sleep(delay)
     
     def send(self, message: str) -> str:
         """
@@ -68,6 +260,9 @@ class LLMClient:
             
         Returns:
             Complete response string
+            
+        Raises:
+            LLMCallError: The call failed
         """
         response_chunks = []
         
@@ -75,32 +270,127 @@ class LLMClient:
             response_chunks.append(chunk)
         
         return ''.join(response_chunks)
-    
-    async def send_async(self, message: str) -> str:
+
+    async def send_async(self, message: str, stream: bool = False) -> str:
         """
-        Async version of send() - runs in thread pool to avoid blocking event loop.
+        Async version of send(). Uses the native async client; with
+        LLM_ASYNC_MODE=thread (or without client.aio) the blocking client
+        runs in the scheduler's thread pool instead.
+        
+        Every attempt takes a slot in this client's llm_scheduler lane; the
+        slot is released during retry backoff, so throttled calls waiting to
+        retry do not block other calls.
         
         Args:
             message: The message/prompt to send
+            stream: Forward chunks to the current token_sink as they arrive
+                    (only for responses shown to the user as-is)
             
         Returns:
             Complete response string
+            
+        Raises:
+            LLMCallError: The call failed and was not (or no longer) retried
         """
-        # Run the blocking send() in a thread pool
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.send, message)
+        sink = token_sink.get() if stream else None
+        attempt, waited = 0, 0.0
+        while True:
+            response_chunks = []
+            try:
+                await gemini_rate_limiter.acquire()
+                async with llm_scheduler.slot(self.lane):
+                    await self._attempt_async(message, response_chunks, sink)
+                gemini_rate_limiter.on_success()
+                return ''.join(response_chunks)
+            
+            except Exception as e:
+                # Chunks already delivered cannot be taken back - no retry then
+                delay = None if response_chunks else self._retry_delay(e, attempt, waited)
+                if delay is None:
+                    raise LLMCallError(e) from e
+                attempt, waited = attempt + 1, waited + delay
+                await asyncio.sleep(delay)
+
+    async def _attempt_async(
+        self,
+        message: str,
+        response_chunks: List[str],
+        sink: Optional[Callable[[str], None]]
+    ) -> None:
+        """One attempt of send_async(), collecting chunks into response_chunks"""
+        if self.native_async:
+            async for chunk in self._stream_once_async(message):
+                response_chunks.append(chunk)
+                if sink is not None:
+                    sink(chunk)
+            return
+
+        # Fallback: run the blocking client in a thread pool
+        loop = asyncio.get_running_loop()
+
+        def produce() -> None:
+            for chunk in self._stream_once(message):
+                response_chunks.append(chunk)
+                if sink is not None:
+                    loop.call_soon_threadsafe(sink, chunk)
+
+        await loop.run_in_executor(llm_scheduler.executor, produce)
+
+    async def send_stateless_async(
+        self,
+        prompt: str,
+        cache_kind: Optional[str] = None,
+        refresh: bool = False
+    ) -> str:
+        """
+        Send a one-off prompt outside this client's chat session (no history,
+        so the answer depends only on the prompt). Identical prompts already
+        in flight are not sent again - callers share the running call's result.
+        
+        Args:
+            prompt: The message/prompt to send
+            cache_kind: Opt in to the response cache; the kind selects the TTL
+                        (e.g. "venue_search", see llm_cache.DEFAULT_TTLS)
+            refresh: Skip the cached response (the new one is still stored),
+                     e.g. when revalidating data that is already stale
+            
+        Returns:
+            Complete response string
+        """
+        key = prompt_key(self.model, self.system_instruction, prompt, self.response_schema)
+        if cache_kind and llm_cache is not None and not refresh:
+            cached = await llm_cache.get_async(key)
+            if cached is not None:
+                logger.info(f"💾 LLM cache hit ({cache_kind})")
+                return cached
+
+        label = " ".join(prompt.split())[:80]
+        return await stateless_calls.run(key, lambda: self._send_fresh_async(prompt, key, cache_kind), label)
+
+    async def _send_fresh_async(self, prompt: str, key: str, cache_kind: Optional[str]) -> str:
+        session = LLMClient(
+            model=self.model,
+            system_instruction=self.system_instruction,
+            lane=self.lane,
+            response_schema=self.response_schema
+        )
+        response = await session.send_async(prompt)  # Errors raise - never cached
+        if cache_kind and llm_cache is not None:
+            await llm_cache.set_async(key, cache_kind, response)
+        return response
 
     def get_history(self):
         """
         Retrieves the conversation history.
         """
-        return self.chat_session.get_history()
+        return (self.async_chat_session or self.chat_session).get_history()
 
     def clear_chat(self):
         """
         Resets the conversation history by creating a new chat session.
         """
         self.chat_session = self.client.chats.create(model=self.model, config=self.config)
+        self.async_chat_session = None
 
 if __name__ == "__main__":
     llm_client = LLMClient(model="gemini-2.5-flash")
@@ -108,7 +398,9 @@ if __name__ == "__main__":
         user_input = input("You: ")
         if user_input.lower() in {"exit", "quit"}:
             break
-        response_generator = llm_client.send_message(user_input)
-        for chunk in response_generator:
-            print(chunk, end='', flush=True)
+        try:
+            for chunk in llm_client.send_message(user_input):
+                print(chunk, end='', flush=True)
+        except LLMCallError as e:
+            print(f"\n[Error: {e}]", end='')
         print()
\ No newline at end of file
@@ -0,0 +1,251 @@
+"""
+LLM Rate Limit - adaptive token bucket and retry policy for Gemini 429s.
+
+The bucket starts unlimited (or at LLM_RATE_LIMIT_RPM) and learns the
+effective quota: every 429 / RESOURCE_EXHAUSTED cuts the rate to a bit below
+the throughput that triggered it, every success raises it slowly again
+(AIMD). Throttled calls are retried with jittered exponential backoff that
+never retries sooner than the delay the server asked for.
+"""
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {"RESOURCE_EXHAUSTED", "UNAVAILABLE"}
+RETRYABLE_CODES = {429, 503}
+
+
+def is_throttle_error(error: Exception) -> bool:
+    """True for quota errors (HTTP 429 / RESOURCE_EXHAUSTED)"""
+    code = getattr(error, "code", None)
+    status = getattr(error, "status", None)
+    if code == 429 or status == "RESOURCE_EXHAUSTED":
+        return True
+    # Errors without a structured code (e.g. wrapped by another library)
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Quota errors and temporary unavailability (503) are worth retrying"""
+    return (
+        is_throttle_error(error)
+        or getattr(error, "code", None) in RETRYABLE_CODES
+        or getattr(error, "status", None) in RETRYABLE_STATUS
+    )
+
+
+def retry_delay_from_error(error: Exception) -> Optional[float]:
+    """
+    Retry delay requested by the server, in seconds: the Retry-After header
+    or google.rpc.RetryInfo.retryDelay ("37s") in the error details.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                pass  # HTTP-date form - fall back to the error details
+
+    details = getattr(error, "details", None)
+    if isinstance(details, dict):
+        details = details.get("error", details).get("details", [])
+    for detail in details if isinstance(details, list) else []:
+        if isinstance(detail, dict) and "retryDelay" in detail:
+            match = re.match(r"^\s*([\d.]+)s\s*$", str(detail["retryDelay"]))
+            if match:
+                return float(match.group(1))
+    return None
+
+
+class AdaptiveRateLimiter:
+    """Thread-safe token bucket whose rate adapts to 429 responses"""
+
+    DECREASE_COOLDOWN = 2.0  # Seconds during which further 429s don't lower the rate again
+
+    def __init__(
+        self,
+        rate_per_minute: Optional[float] = None,
+        min_per_minute: float = 5.0,
+        max_per_minute: float = 600.0,
+        burst: float = 5.0,
+        decrease_factor: float = 0.8
+    ):
+        """
+        Args:
+            rate_per_minute: Initial rate, None = unlimited until the first 429
+            min_per_minute: The rate never drops below this
+            max_per_minute: Additive increase stops here
+            burst: Bucket capacity (calls that may start back to back)
+            decrease_factor: New rate = observed throughput * factor on a 429
+        """
+        self.min_rate = min_per_minute / 60
+        self.max_rate = max_per_minute / 60
+        self.rate = rate_per_minute / 60 if rate_per_minute else None  # Calls per second
+        self.burst = burst
+        self.decrease_factor = decrease_factor
+        self._lock = threading.Lock()
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0  # Server-requested pause (retry delay) for everyone
+        self._last_decrease = float("-inf")
+        self._starts = deque(maxlen=10000)  # Start times of recent calls (throughput window)
+        self._counters = {"calls": 0, "throttled": 0, "delayed": 0, "delay_seconds": 0.0}
+
+    def _reserve(self) -> float:
+        """Take a token, or return how long to wait before trying again"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+
+            if self.rate is not None:
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens < 1:
+                    return (1 - self._tokens) / self.rate
+                self._tokens -= 1
+
+            self._starts.append(now)
+            self._counters["calls"] += 1
+            return 0.0
+
+    def _record_delay(self, seconds: float) -> None:
+        with self._lock:
+            self._counters["delayed"] += 1
+            self._counters["delay_seconds"] += seconds
+
+    async def acquire(self) -> None:
+        """Wait (without blocking the event loop) until a call may start"""
+        waited = 0.0
+        while (wait := self._reserve()) > 0:
+            waited += wait
+            await asyncio.sleep(wait)
+        if waited:
+            self._record_delay(waited)
+
+    def acquire_blocking(self) -> None:
+        """acquire() for the synchronous client"""
+        waited = 0.0
+        while (wait := self._reserve()) > 0:
+            waited += wait
+            time.sleep(wait)
+        if waited:
+            self._record_delay(waited)
+
+    def on_throttled(self, retry_delay: Optional[float] = None) -> None:
+        """Learn from a 429: slow down below the throughput that caused it"""
+        with self._lock:
+            now = time.monotonic()
+            self._counters["throttled"] += 1
+            if retry_delay:
+                self._paused_until = max(self._paused_until, now + retry_delay)
+
+            # Concurrent calls of one burst fail together - count it as one signal
+            if now - self._last_decrease < self.DECREASE_COOLDOWN:
+                return
+            self._last_decrease = now
+
+            while self._starts and self._starts[0] < now - 60:
+                self._starts.popleft()
+            observed = len(self._starts) / 60
+            current = self.rate if self.rate is not None else max(observed, self.min_rate)
+            self.rate = max(self.min_rate, min(current, observed) * self.decrease_factor)
+            self._tokens = min(self._tokens, 1.0)  # Drop the burst, keep one call for the retry
+            self._updated = now
+            logger.warning(
+                f"🐢 Gemini quota hit - limiting to {self.rate * 60:.1f} calls/min"
+                + (f", pausing {retry_delay:.1f}s" if retry_delay else "")
+            )
+
+    def on_success(self) -> None:
+        """Additive increase: recover about one call/min per successful call"""
+        with self._lock:
+            if self.rate is not None:
+                self.rate = min(self.max_rate, self.rate + 1 / 60)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate_per_minute": round(self.rate * 60, 1) if self.rate is not None else None,
+                "calls": self._counters["calls"],
+                "throttled": self._counters["throttled"],
+                "delayed": self._counters["delayed"],
+                "delay_seconds": round(self._counters["delay_seconds"], 2)
+            }
+
+
+class RetryPolicy:
+    """Jittered exponential backoff that honours server retry delays"""
+
+    def __init__(
+        self,
+        max_retries: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        max_total_delay: float = 90.0
+    ):
+        """
+        Args:
+            max_retries: Retries after the first attempt
+            base_delay: Backoff of the first retry (doubles every attempt)
+            max_delay: Cap for a single backoff
+            max_total_delay: Give up instead of waiting longer than this in total
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_total_delay = max_total_delay
+        self._lock = threading.Lock()
+        self._counters = {"retries": 0, "gave_up": 0}
+
+    def next_delay(self, error: Exception, attempt: int, waited: float) -> Optional[float]:
+        """
+        Delay before retrying a failed call, or None to give up.
+
+        Args:
+            error: The exception of the failed attempt
+            attempt: Number of retries already made
+            waited: Total seconds already spent waiting for retries
+        """
+        if not is_retryable_error(error):
+            return None
+
+        backoff = min(self.max_delay, self.base_delay * 2 ** attempt)
+        delay = random.uniform(backoff / 2, backoff)
+        server_delay = retry_delay_from_error(error)
+        if server_delay is not None:
+            # Never earlier than the server asked for; jitter spreads the herd
+            delay = server_delay + random.uniform(0, backoff / 2)
+
+        with self._lock:
+            if attempt >= self.max_retries or waited + delay > self.max_total_delay:
+                self._counters["gave_up"] += 1
+                return None
+            self._counters["retries"] += 1
+        return delay
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+# Global instances (one Gemini quota per process)
+gemini_rate_limiter = AdaptiveRateLimiter(rate_per_minute=_env_float("LLM_RATE_LIMIT_RPM"))
+gemini_retry_policy = RetryPolicy(max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")))
@@ -0,0 +1,144 @@
+"""
+LLM Scheduler - bounded dispatch of LLM calls with priority lanes.
+
+Every async LLM call takes a slot first. Interactive calls (chat replies,
+plan generation, gathering questions) are always dispatched before queued
+background calls (venue search/parsing, post-call analysis), and background
+calls can never occupy all slots, so a burst of background work does not
+starve a user's turn.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import logging
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+LANES = (INTERACTIVE, BACKGROUND)  # Dispatch order
+
+
+class LLMScheduler:
+    """Concurrency limiter with per-lane FIFO queues and wait-time metrics"""
+
+    def __init__(self, max_concurrency: int = 8, max_background: int = 4):
+        """
+        Args:
+            max_concurrency: LLM calls in flight at once (all lanes)
+            max_background: Of those, at most this many background calls
+                (clamped to max_concurrency - 1, so one slot is always left
+                for interactive calls; with a single slot it is shared)
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        if max_concurrency > 1:
+            self.max_background = max(1, min(max_background, max_concurrency - 1))
+        else:
+            self.max_background = 1
+        self._running = {lane: 0 for lane in LANES}
+        self._waiters = {lane: deque() for lane in LANES}  # lane -> futures in arrival order
+        self._metrics = {
+            lane: {"completed": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for lane in LANES
+        }
+        self._executor = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Dedicated pool for the blocking fallback path (sized to the slot count)"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency,
+                thread_name_prefix="llm"
+            )
+        return self._executor
+
+    def _can_start(self, lane: str) -> bool:
+        if sum(self._running.values()) >= self.max_concurrency:
+            return False
+        if lane == BACKGROUND:
+            return self._running[BACKGROUND] < self.max_background
+        return True
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiters, interactive lane first"""
+        for lane in LANES:
+            waiters = self._waiters[lane]
+            while waiters and self._can_start(lane):
+                future = waiters.popleft()
+                if future.done():  # Cancelled while queued
+                    continue
+                self._running[lane] += 1
+                future.set_result(None)
+
+    def _release(self, lane: str) -> None:
+        self._running[lane] -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, lane: str = INTERACTIVE):
+        """Hold one LLM slot in the given lane for the duration of the async with-block"""
+        if lane not in self._running:
+            raise ValueError(f"Unknown LLM lane: {lane}")
+
+        queued_at = time.monotonic()
+        if not self._waiters[lane] and self._can_start(lane):
+            self._running[lane] += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters[lane].append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._release(lane)  # Slot was granted just before the cancel
+                else:
+                    try:
+                        self._waiters[lane].remove(future)
+                    except ValueError:
+                        pass
+                raise
+
+        waited = time.monotonic() - queued_at
+        metrics = self._metrics[lane]
+        metrics["wait_total"] += waited
+        metrics["wait_max"] = max(metrics["wait_max"], waited)
+        if waited > 1:
+            logger.info(f"⏳ {lane} LLM call waited {waited:.2f}s for a slot")
+
+        try:
+            yield
+        finally:
+            metrics["completed"] += 1
+            self._release(lane)
+
+    def stats(self) -> dict:
+        """Queue depth, running calls and wait times per lane"""
+        lanes = {}
+        for lane in LANES:
+            metrics = self._metrics[lane]
+            started = metrics["completed"] + self._running[lane]
+            lanes[lane] = {
+                "running": self._running[lane],
+                "queued": sum(1 for future in self._waiters[lane] if not future.done()),
+                "completed": metrics["completed"],
+                "avg_wait_ms": round(metrics["wait_total"] / started * 1000, 1) if started else 0.0,
+                "max_wait_ms": round(metrics["wait_max"] * 1000, 1)
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_background": self.max_background,
+            "lanes": lanes
+        }
+
+
+# Global instance
+llm_scheduler = LLMScheduler(
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+    max_background=int(os.getenv("LLM_MAX_BACKGROUND", "4"))
+)
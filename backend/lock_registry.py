@@ -0,0 +1,151 @@
+"""
+Per-key lock registries that drop locks as soon as nobody holds or waits for them.
+Used for per-conversation / per-plan locking without unbounded growth.
+
+FileLockRegistry additionally takes an fcntl advisory lock on a per-key lock
+file, so several processes (e.g. uvicorn --workers N) sharing one storage
+directory are serialized as well.
+"""
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, only needed for STORAGE_LOCKING=fcntl
+    fcntl = None
+
+
+class LockRegistry:
+    """
+    Refcounted registry of threading locks.
+
+    `with registry.hold(key):` creates the lock on demand; the entry is removed
+    when the last holder/waiter releases it, so the registry size equals the
+    number of keys currently in use.
+    """
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._entries = {}  # key -> [threading.Lock, refcount]
+
+    @contextmanager
+    def hold(self, key: str):
+        """Acquire the lock for key for the duration of the with-block"""
+        with self._guard:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = [threading.Lock(), 0]
+            entry[1] += 1
+
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._entries[key]
+
+    def __len__(self) -> int:
+        with self._guard:
+            return len(self._entries)
+
+    def discard(self, key: str) -> None:
+        """Forget any state kept for a deleted key (nothing to do for in-process locks)"""
+
+
+@contextmanager
+def flock(path: Path, shared: bool = False):
+    """
+    Hold an fcntl advisory lock on path (created if missing) for the duration
+    of the with-block. Waits until the lock is available.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)  # Closing the descriptor releases the lock
+
+
+class FileLockRegistry(LockRegistry):
+    """
+    LockRegistry that also holds an exclusive fcntl lock on `<lock_dir>/<key>.lock`,
+    serializing holders across processes on the same host.
+    """
+
+    def __init__(self, lock_dir: Path):
+        if fcntl is None:
+            raise ValueError("STORAGE_LOCKING=fcntl requires a POSIX system (fcntl module)")
+        super().__init__()
+        self.lock_dir = Path(lock_dir)
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
+
+    def _lock_path(self, key: str) -> Path:
+        return self.lock_dir / f"{key}.lock"
+
+    @contextmanager
+    def hold(self, key: str):
+        """Acquire the in-process lock, then the cross-process file lock"""
+        with super().hold(key):
+            path = self._lock_path(key)
+            while True:
+                fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                    # The file may have been removed (see discard) while we waited;
+                    # then our lock is on an orphaned inode and we must retry
+                    try:
+                        current = os.stat(path).st_ino
+                    except FileNotFoundError:
+                        current = None
+                    if current == os.fstat(fd).st_ino:
+                        break
+                except BaseException:
+                    os.close(fd)
+                    raise
+                os.close(fd)
+
+            try:
+                yield
+            finally:
+                os.close(fd)
+
+    def discard(self, key: str) -> None:
+        """Remove the lock file of a deleted object (caller holds the key)"""
+        try:
+            self._lock_path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+
+class AsyncLockRegistry:
+    """
+    Refcounted registry of asyncio locks (same semantics as LockRegistry).
+    Must only be used from a single event loop.
+    """
+
+    def __init__(self):
+        self._entries = {}  # key -> [asyncio.Lock, refcount]
+
+    @asynccontextmanager
+    async def hold(self, key: str):
+        """Acquire the lock for key for the duration of the async with-block"""
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
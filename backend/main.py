@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routers import calls, appointments, chat
+from async_storage import async_storage
 import dotenv 
 dotenv.load_dotenv()
 
@@ -25,6 +26,11 @@ app.include_router(calls.router, prefix="/api/calls", tags=["calls"])
 app.include_router(appointments.router, prefix="/api/appointments", tags=["appointments"])
 app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
 
+@app.on_event("shutdown")
+async def flush_storage():
+    """Write out messages still waiting in the write-behind queue"""
+    await async_storage.flush()
+
 @app.get("/")
 async def root():
     return {
@@ -64,6 +64,7 @@ class Message(BaseModel):
     content: str
     timestamp: datetime
     metadata: Optional[dict] = None
+    seq: Optional[int] = None  # Position in the conversation (0, 1, 2, ...), assigned by storage
 
 class ConversationStatus(str, Enum):
     ACTIVE = "active"
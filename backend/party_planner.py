@@ -182,7 +182,7 @@ Gdy masz WSZYSTKO, zwróć JSON (włącz dane z original):
             
             # ✅ ASYNC call - won't block!
             logger.info("🔄 Calling LLM to generate plan...")
-            response = await llm_client.send_async(prompt)
+            response = await llm_client.send_async(prompt, stream=True)
             logger.info("✅ Plan generated successfully")
             
             return response.strip()
@@ -205,7 +205,7 @@ Gdy masz WSZYSTKO, zwróć JSON (włącz dane z original):
             
             # ✅ ASYNC call - won't block!
             logger.info("🔄 Calling LLM to refine plan...")
-            response = await llm_client.send_async(prompt)
+            response = await llm_client.send_async(prompt, stream=True)
             logger.info("✅ Plan refined successfully")
             
             return response.strip()
@@ -232,8 +232,8 @@ Gdy masz WSZYSTKO, zwróć JSON (włącz dane z original):
         
         self.state = PlanState.GATHERING
         
-        # Get first question from gatherer (sync OK here - initialization)
-        first_question = self.info_gatherer.process_message("Zacznij zbieranie danych")
+        # Get first question from gatherer (async - throttling/retries must not block the loop)
+        first_question = await self.info_gatherer.process_message_async("Zacznij zbieranie danych")
         
         return f"""✅ Plan zatwierdzony!
 
@@ -431,10 +431,10 @@ Gdy masz WSZYSTKO, zwróć JSON (włącz dane z original):
                 self.print_task_list_to_console(tasks)
                 
                 # Save tasks to storage
-                from storage_manager import storage_manager
+                from async_storage import async_storage
                 plan_id = f"plan-{str(uuid.uuid4())[:8]}"
                 conversation_id = self.gathered_info.get("conversation_id", "")
-                storage_manager.save_task_list(tasks, plan_id, conversation_id)
+                await async_storage.save_task_list(tasks, plan_id, conversation_id)
                 logger.info(f"Saved {len(tasks)} tasks to storage (plan_id: {plan_id})")
                 
                 # ⭐ Save plan_id for later retrieval
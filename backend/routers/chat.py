@@ -1,25 +1,39 @@
 """
 Chat Router - API endpoints for chat functionality
 """
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from typing import List, Optional
+import asyncio
+import json
 import logging
+import uuid
 
 from models import (
     Conversation, 
     Message, 
     MessageRequest, 
+    MessageRole,
     ConversationMetadata,
-    ConversationResponse,
-    MessageResponse
+    ConversationResponse
 )
-from storage_manager import storage_manager
+from async_storage import async_storage
 from chat_service import chat_service
+from conversation_events import conversation_events
+from llm_client import token_sink, stateless_calls
+from llm_cache import llm_cache
+from venue_searcher import venue_cache
+from llm_scheduler import llm_scheduler
+from llm_rate_limit import gemini_rate_limiter, gemini_retry_policy
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Streamed replies still being generated (the event loop only keeps weak references to tasks)
+reply_tasks = set()
+
 
 @router.get("/health")
 async def health_check():
@@ -27,7 +41,16 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "chat",
-        "storage_ready": storage_manager.base_path.exists()
+        "storage_ready": async_storage.storage.base_path.exists(),
+        "conversation_cache": async_storage.cache_stats(),
+        "locks": dict(async_storage.lock_stats(), chat=len(chat_service.conversation_locks)),
+        "long_poll_waiters": async_storage.waiter_count(),
+        "event_subscribers": conversation_events.subscriber_count(),
+        "llm_scheduler": llm_scheduler.stats(),
+        "llm_rate_limit": dict(gemini_rate_limiter.stats(), **gemini_retry_policy.stats()),
+        "llm_coalescing": stateless_calls.stats(),
+        "llm_cache": llm_cache.stats() if llm_cache is not None else None,
+        "venue_cache": venue_cache.stats() if venue_cache is not None else None
     }
 
 
@@ -38,7 +61,7 @@ async def create_conversation():
     """
     try:
         # Create empty conversation
-        conversation = chat_service.create_conversation(initial_message=None)
+        conversation = await chat_service.create_conversation(initial_message=None)
         
         return ConversationResponse(
             success=True,
@@ -57,7 +80,7 @@ async def list_conversations():
     Get list of all conversations with metadata (without full message history).
     """
     try:
-        conversations = storage_manager.list_conversations()
+        conversations = await async_storage.list_conversations()
         return conversations
         
     except Exception as e:
@@ -71,7 +94,7 @@ async def get_conversation(conversation_id: str):
     Get a specific conversation with full message history.
     """
     try:
-        conversation = storage_manager.load_conversation(conversation_id)
+        conversation = await async_storage.load_conversation(conversation_id)
         
         if not conversation:
             raise HTTPException(
@@ -88,6 +111,128 @@ async def get_conversation(conversation_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def save_user_message(conversation_id: str, content: str) -> Message:
+    """
+    Save the user message IMMEDIATELY (before LLM processing), so the frontend
+    sees it while waiting for the response. Raises 500 if it cannot be saved.
+    """
+    logger.info(f"💾 Creating user message...")
+    user_message = Message(
+        id=str(uuid.uuid4()),
+        conversation_id=conversation_id,
+        role=MessageRole.USER,
+        content=content,
+        timestamp=datetime.utcnow()
+    )
+    
+    logger.info(f"💾 Saving user message to storage...")
+    success = await async_storage.add_message(
+        conversation_id,
+        user_message
+    )
+    # Make sure the user message is durable before the slow LLM step
+    success = success and await async_storage.flush(conversation_id)
+    if not success:
+        logger.error(f"❌ Failed to save user message!")
+        raise HTTPException(status_code=500, detail="Failed to save user message")
+    logger.info(f"✅ User message saved to conversation {conversation_id}")
+    return user_message
+
+
+async def generate_reply(conversation_id: str, content: str) -> Message:
+    """
+    Process a user message with the chat service and save the AI response.
+    AI errors are saved and returned as an error message instead of raised.
+    
+    Returns:
+        The saved assistant message, or a "processing" placeholder when the
+        messages are saved directly by a background step
+    """
+    # NOW: Process message and generate AI response (this takes time)
+    logger.info(f"🤖 Starting AI processing for conversation {conversation_id}...")
+    logger.info(f"   Message content: {content}")
+    logger.info(f"   Calling chat_service.process_user_message()...")
+    try:
+        logger.info(f"   ⏳ Awaiting process_user_message()...")
+        _, assistant_message = await chat_service.process_user_message(
+            conversation_id,
+            content
+        )
+        logger.info(f"✅ AI processing complete!")
+        if assistant_message:
+            logger.info(f"   Assistant message ID: {assistant_message.id}")
+            logger.info(f"   Assistant message preview: {assistant_message.content[:50]}...")
+        else:
+            logger.info(f"   ⚠️ No assistant message (messages already saved directly)")
+    except Exception as ai_error:
+        logger.error(f"❌ AI processing failed: {ai_error}", exc_info=True)
+        
+        # ✅ DONT CRASH - save error message for user!
+        error_message = Message(
+            id=str(uuid.uuid4()),
+            conversation_id=conversation_id,
+            role=MessageRole.ASSISTANT,
+            content=f"❌ Przepraszam, wystąpił błąd podczas przetwarzania:\n\n`{str(ai_error)}`\n\nSpróbuj ponownie lub sformułuj zapytanie inaczej.",
+            timestamp=datetime.utcnow(),
+            metadata={
+                "error": True,
+                "should_continue_refresh": False  # ✅ Stop - wait for user
+            }
+        )
+        await async_storage.add_message(conversation_id, error_message)
+        logger.info(f"✅ Error message saved for user")
+        
+        # Return error message instead of crashing
+        assistant_message = error_message
+    
+    # Save assistant message (if one was created)
+    if assistant_message:
+        logger.info(f"💾 Saving assistant message...")
+        success = await async_storage.add_message(
+            conversation_id,
+            assistant_message
+        )
+        success = success and await async_storage.flush(conversation_id)
+        if not success:
+            logger.error(f"❌ Failed to save assistant message!")
+            raise HTTPException(status_code=500, detail="Failed to save assistant message")
+        logger.info(f"✅ Assistant message saved to conversation {conversation_id}")
+        
+        # Return assistant message
+        logger.info(f"📤 Returning assistant message")
+        return assistant_message
+    else:
+        # Messages were already saved directly (e.g., during GATHERING->SEARCHING transition)
+        # Return a dummy message for the API response (frontend won't see this, it polls for updates)
+        logger.info(f"📤 No assistant message to return (messages saved directly)")
+        return Message(
+            id="processing",
+            conversation_id=conversation_id,
+            role=MessageRole.ASSISTANT,
+            content="Processing...",
+            timestamp=datetime.utcnow(),
+            metadata={"should_continue_refresh": True}
+        )
+
+
+async def save_critical_error(conversation_id: str, error: Exception) -> Message:
+    """Last resort - save an unexpected error as an assistant message and return it"""
+    error_message = Message(
+        id=str(uuid.uuid4()),
+        conversation_id=conversation_id,
+        role=MessageRole.ASSISTANT,
+        content=f"❌ Wystąpił nieoczekiwany błąd:\n\n`{str(error)}`\n\nZapiszę to i naprawię. Spróbuj ponownie.",
+        timestamp=datetime.utcnow(),
+        metadata={"critical_error": True}
+    )
+    success = await async_storage.add_message(conversation_id, error_message)
+    success = success and await async_storage.flush(conversation_id)
+    if not success:
+        logger.error(f"❌ Failed to save error message!")
+        raise HTTPException(status_code=500, detail="Failed to save error message")
+    return error_message
+
+
 @router.post("/conversations/{conversation_id}/messages", response_model=Message)
 async def send_message(
     conversation_id: str,
@@ -108,7 +253,7 @@ async def send_message(
     try:
         # Check if conversation exists
         logger.info(f"🔍 Checking if conversation {conversation_id} exists...")
-        if not storage_manager.conversation_exists(conversation_id):
+        if not await async_storage.conversation_exists(conversation_id):
             logger.error(f"❌ Conversation {conversation_id} not found")
             raise HTTPException(
                 status_code=404,
@@ -116,95 +261,8 @@ async def send_message(
             )
         logger.info(f"✅ Conversation exists")
         
-        # FIRST: Save user message IMMEDIATELY (before LLM processing)
-        # This allows frontend to see the user message while waiting for response
-        import uuid
-        from datetime import datetime
-        from models import MessageRole
-        
-        logger.info(f"💾 Creating user message...")
-        user_message = Message(
-            id=str(uuid.uuid4()),
-            conversation_id=conversation_id,
-            role=MessageRole.USER,
-            content=message_request.content,
-            timestamp=datetime.utcnow()
-        )
-        
-        logger.info(f"💾 Saving user message to storage...")
-        success = storage_manager.add_message_to_conversation(
-            conversation_id,
-            user_message
-        )
-        if not success:
-            logger.error(f"❌ Failed to save user message!")
-            raise HTTPException(status_code=500, detail="Failed to save user message")
-        logger.info(f"✅ User message saved to conversation {conversation_id}")
-        
-        # NOW: Process message and generate AI response (this takes time)
-        logger.info(f"🤖 Starting AI processing for conversation {conversation_id}...")
-        logger.info(f"   Message content: {message_request.content}")
-        logger.info(f"   Calling chat_service.process_user_message()...")
-        try:
-            logger.info(f"   ⏳ Awaiting process_user_message()...")
-            _, assistant_message = await chat_service.process_user_message(
-                conversation_id,
-                message_request.content
-            )
-            logger.info(f"✅ AI processing complete!")
-            if assistant_message:
-                logger.info(f"   Assistant message ID: {assistant_message.id}")
-                logger.info(f"   Assistant message preview: {assistant_message.content[:50]}...")
-            else:
-                logger.info(f"   ⚠️ No assistant message (messages already saved directly)")
-        except Exception as ai_error:
-            logger.error(f"❌ AI processing failed: {ai_error}", exc_info=True)
-            
-            # ✅ DONT CRASH - save error message for user!
-            error_message = Message(
-                id=str(uuid.uuid4()),
-                conversation_id=conversation_id,
-                role=MessageRole.ASSISTANT,
-                content=f"❌ Przepraszam, wystąpił błąd podczas przetwarzania:\n\n`{str(ai_error)}`\n\nSpróbuj ponownie lub sformułuj zapytanie inaczej.",
-                timestamp=datetime.utcnow(),
-                metadata={
-                    "error": True,
-                    "should_continue_refresh": False  # ✅ Stop - wait for user
-                }
-            )
-            storage_manager.add_message_to_conversation(conversation_id, error_message)
-            logger.info(f"✅ Error message saved for user")
-            
-            # Return error message instead of crashing
-            assistant_message = error_message
-        
-        # Save assistant message (if one was created)
-        if assistant_message:
-            logger.info(f"💾 Saving assistant message...")
-            success = storage_manager.add_message_to_conversation(
-                conversation_id,
-                assistant_message
-            )
-            if not success:
-                logger.error(f"❌ Failed to save assistant message!")
-                raise HTTPException(status_code=500, detail="Failed to save assistant message")
-            logger.info(f"✅ Assistant message saved to conversation {conversation_id}")
-            
-            # Return assistant message
-            logger.info(f"📤 Returning assistant message")
-            return assistant_message
-        else:
-            # Messages were already saved directly (e.g., during GATHERING->SEARCHING transition)
-            # Return a dummy message for the API response (frontend won't see this, it polls for updates)
-            logger.info(f"📤 No assistant message to return (messages saved directly)")
-            return Message(
-                id="processing",
-                conversation_id=conversation_id,
-                role=MessageRole.ASSISTANT,
-                content="Processing...",
-                timestamp=datetime.utcnow(),
-                metadata={"should_continue_refresh": True}
-            )
+        await save_user_message(conversation_id, message_request.content)
+        return await generate_reply(conversation_id, message_request.content)
         
     except HTTPException:
         raise
@@ -213,28 +271,91 @@ async def send_message(
         
         # ✅ Last resort - save error and return it instead of 500
         try:
-            error_message = Message(
-                id=str(uuid.uuid4()),
-                conversation_id=conversation_id,
-                role=MessageRole.ASSISTANT,
-                content=f"❌ Wystąpił nieoczekiwany błąd:\n\n`{str(e)}`\n\nZapiszę to i naprawię. Spróbuj ponownie.",
-                timestamp=datetime.utcnow(),
-                metadata={"critical_error": True}
-            )
-            storage_manager.add_message_to_conversation(conversation_id, error_message)
-            return error_message
+            return await save_critical_error(conversation_id, e)
         except:
             # If even saving fails, then raise 500
             raise HTTPException(status_code=500, detail=f"Critical error: {str(e)}")
 
 
+@router.post("/conversations/{conversation_id}/messages/stream")
+async def send_message_stream(
+    conversation_id: str,
+    message_request: MessageRequest
+):
+    """
+    Send a message and stream the AI response as Server-Sent Events.
+    
+    Events:
+    - user_message: the saved user message
+    - delta: {"text": ...} response chunks as the LLM generates them
+      (chat answers, plan generation and refinement)
+    - done: the final saved assistant message (same as POST /messages returns);
+      it replaces the streamed text, which may differ in whitespace/error wording
+    
+    The response is generated and saved even if the client disconnects.
+    """
+    logger.info(f"📥 Received streaming message request for conversation {conversation_id}")
+    
+    if not await async_storage.conversation_exists(conversation_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Conversation {conversation_id} not found"
+        )
+    
+    user_message = await save_user_message(conversation_id, message_request.content)
+    events = asyncio.Queue()
+    streaming = True
+    
+    def on_chunk(text: str) -> None:
+        # Background tasks started by this request inherit the sink - ignore them afterwards
+        if streaming:
+            events.put_nowait(format_sse("delta", {"text": text}))
+    
+    async def process() -> None:
+        token_sink.set(on_chunk)
+        try:
+            reply = await generate_reply(conversation_id, message_request.content)
+        except Exception as e:
+            logger.error(f"❌ CRITICAL ERROR in send_message_stream: {e}", exc_info=True)
+            try:
+                reply = await save_critical_error(conversation_id, e)
+            except Exception:
+                events.put_nowait(format_sse("error", {"detail": f"Critical error: {str(e)}"}))
+                return
+        events.put_nowait(format_sse("done", reply.model_dump(mode='json'), reply.seq))
+    
+    # Started now, not when the response is first iterated, and referenced from
+    # reply_tasks so it keeps running (and is saved) after a client disconnect
+    task = asyncio.create_task(process())
+    reply_tasks.add(task)
+    task.add_done_callback(reply_tasks.discard)
+    
+    async def stream():
+        nonlocal streaming
+        try:
+            yield format_sse("user_message", user_message.model_dump(mode='json'), user_message.seq)
+            while not (task.done() and events.empty()):
+                try:
+                    yield await asyncio.wait_for(events.get(), SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            streaming = False
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.delete("/conversations/{conversation_id}")
 async def delete_conversation(conversation_id: str):
     """
     Delete a conversation.
     """
     try:
-        success = storage_manager.delete_conversation(conversation_id)
+        success = await async_storage.delete_conversation(conversation_id)
         
         if not success:
             raise HTTPException(
@@ -254,28 +375,56 @@ async def delete_conversation(conversation_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def resolve_cursor(conversation_id: str, after: str) -> int:
+    """
+    Resolve a message cursor (seq or message id) to a seq.
+    Raises 404 if a message id is not found in the conversation.
+    """
+    if after.lstrip('-').isdigit():
+        return int(after)
+    
+    seq = await async_storage.find_message_seq(conversation_id, after)
+    if seq is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Message {after} not found in conversation {conversation_id}"
+        )
+    return seq
+
+
 @router.get("/conversations/{conversation_id}/messages", response_model=List[Message])
-async def get_messages(conversation_id: str, limit: int = 50, offset: int = 0):
+async def get_messages(
+    conversation_id: str,
+    limit: int = Query(50, ge=0),
+    offset: int = Query(0, ge=0),
+    newest_first: bool = False,
+    after: Optional[str] = None
+):
     """
     Get messages from a conversation with pagination.
+    Only the requested window is read from storage.
     
     Args:
         conversation_id: ID of the conversation
         limit: Maximum number of messages to return (default 50)
         offset: Number of messages to skip (default 0)
+        newest_first: Count offset from the newest message and return newest first
+        after: Cursor (message seq or message id) - return only messages newer
+            than it, oldest first (offset and newest_first are ignored)
     """
     try:
-        conversation = storage_manager.load_conversation(conversation_id)
+        if after is not None:
+            seq = await resolve_cursor(conversation_id, after)
+            offset, newest_first = max(seq + 1, 0), False
         
-        if not conversation:
+        messages = await async_storage.load_messages(conversation_id, limit, offset, newest_first)
+        
+        if messages is None:
             raise HTTPException(
                 status_code=404,
                 detail=f"Conversation {conversation_id} not found"
             )
         
-        # Apply pagination
-        messages = conversation.messages[offset:offset + limit]
-        
         return messages
         
     except HTTPException:
@@ -284,3 +433,151 @@ async def get_messages(conversation_id: str, limit: int = 50, offset: int = 0):
         logger.error(f"Failed to get messages for conversation {conversation_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.get("/conversations/{conversation_id}/wait", response_model=List[Message])
+async def wait_for_messages(
+    conversation_id: str,
+    after: Optional[str] = None,
+    timeout: float = Query(25, ge=0, le=60),
+    limit: int = Query(100, ge=1)
+):
+    """
+    Long-poll for new messages: responds as soon as a message newer than the
+    cursor exists, or with an empty list when the timeout expires.
+    
+    Args:
+        conversation_id: ID of the conversation
+        after: Cursor (message seq or message id); default is the newest message,
+            i.e. wait for the next one
+        timeout: Maximum seconds to hold the request open (default 25)
+        limit: Maximum number of messages to return (default 100)
+    """
+    try:
+        if after is not None:
+            seq = await resolve_cursor(conversation_id, after)
+        else:
+            newest = await async_storage.load_messages(conversation_id, 1, 0, newest_first=True)
+            if newest is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Conversation {conversation_id} not found"
+                )
+            seq = newest[0].seq if newest else -1
+        
+        messages = await async_storage.wait_for_messages(conversation_id, seq, limit, timeout)
+        
+        if messages is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Conversation {conversation_id} not found"
+            )
+        
+        return messages
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to wait for messages in conversation {conversation_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+SSE_HEARTBEAT_SECONDS = 15
+SSE_REPLAY_BATCH = 100
+
+
+def format_sse(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    """Format one Server-Sent Event"""
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def message_to_sse(message: Message) -> List[str]:
+    """
+    SSE events for a persisted message: always a "message" event, plus a
+    "call_stage" event when the message records a voice call stage transition.
+    The event id is the message seq, so reconnecting clients resume from it.
+    """
+    events = [format_sse("message", message.model_dump(mode='json'), message.seq)]
+    
+    metadata = message.metadata or {}
+    if metadata.get("call_stage"):
+        events.append(format_sse("call_stage", {
+            "call_id": metadata.get("call_id"),
+            "call_stage": metadata["call_stage"],
+            "step": metadata.get("step"),
+            "message_id": message.id,
+            "seq": message.seq,
+        }, message.seq))
+    return events
+
+
+@router.get("/conversations/{conversation_id}/events")
+async def conversation_events_stream(conversation_id: str, request: Request, after: Optional[str] = None):
+    """
+    Server-Sent Events stream of a conversation: pushes every new message (and
+    call stage transition) as soon as it is persisted.
+    
+    Messages come from an in-process fan-out, so any number of tabs can watch
+    one conversation without extra storage reads. Storage is read only to
+    replay messages after a cursor on (re)connect.
+    
+    Args:
+        conversation_id: ID of the conversation
+        after: Cursor (message seq or message id) to replay from; the
+            Last-Event-ID header sent by reconnecting EventSources is used
+            if absent. Without a cursor only new messages are streamed.
+    """
+    if not await async_storage.conversation_exists(conversation_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Conversation {conversation_id} not found"
+        )
+    
+    cursor = after or request.headers.get("last-event-id")
+    start_seq = await resolve_cursor(conversation_id, cursor) if cursor else None
+    
+    async def stream():
+        # Subscribe before reading storage, so nothing falls in between
+        queue = conversation_events.subscribe(conversation_id)
+        try:
+            last_seq = start_seq
+            if last_seq is None:
+                newest = await async_storage.load_messages(conversation_id, 1, 0, newest_first=True)
+                last_seq = newest[0].seq if newest else -1
+            else:
+                while True:
+                    missed = await async_storage.load_messages(
+                        conversation_id, SSE_REPLAY_BATCH, max(last_seq + 1, 0)
+                    ) or []
+                    for message in missed:
+                        for event in message_to_sse(message):
+                            yield event
+                        last_seq = message.seq
+                    if len(missed) < SSE_REPLAY_BATCH:
+                        break
+            
+            yield "retry: 3000\n\n"
+            
+            # A subscriber dropped for falling behind ends its stream after
+            # draining the queue; the browser reconnects with Last-Event-ID
+            while conversation_events.is_subscribed(conversation_id, queue) or not queue.empty():
+                message = await conversation_events.next_message(queue, SSE_HEARTBEAT_SECONDS)
+                if message is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                if message.seq is not None and message.seq <= last_seq:
+                    continue  # Already sent during replay
+                for event in message_to_sse(message):
+                    yield event
+                if message.seq is not None:
+                    last_seq = message.seq
+        finally:
+            conversation_events.unsubscribe(conversation_id, queue)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
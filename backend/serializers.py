@@ -0,0 +1,111 @@
+"""
+On-disk serialization formats for conversation headers, plans and task lists.
+
+Every file written through this module carries a format marker:
+- JSON formats store it as a top-level "_format" key (files stay valid JSON)
+- binary formats start with a b"WAI1:<format>\n" header line
+
+Files without a marker are legacy pretty-printed JSON and are read as such,
+so old and new files can live side by side.
+"""
+import json
+from typing import Dict
+import logging
+
+try:
+    import msgpack
+except ImportError:  # Optional (requirements-optional.txt), only needed for STORAGE_FORMAT=msgpack
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # Optional (requirements-optional.txt), speeds up compact JSON
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_KEY = "_format"
+BINARY_MAGIC = b"WAI1:"
+
+
+class JsonSerializer:
+    """Pretty-printed JSON (the original layout, easy to inspect by hand)"""
+
+    name = "json"
+
+    def dumps(self, data: dict) -> bytes:
+        data = dict(data, **{FORMAT_KEY: self.name})
+        return json.dumps(data, indent=2, ensure_ascii=False, default=str).encode('utf-8')
+
+    def loads(self, payload: bytes) -> dict:
+        return json.loads(payload)
+
+
+class CompactJsonSerializer:
+    """JSON without whitespace; uses orjson when installed"""
+
+    name = "json-compact"
+
+    def dumps(self, data: dict) -> bytes:
+        data = dict(data, **{FORMAT_KEY: self.name})
+        if orjson is not None:
+            return orjson.dumps(data, default=str)
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+    def loads(self, payload: bytes) -> dict:
+        if orjson is not None:
+            return orjson.loads(payload)
+        return json.loads(payload)
+
+
+class MsgpackSerializer:
+    """Binary MessagePack (requires the msgpack package)"""
+
+    name = "msgpack"
+
+    def __init__(self):
+        if msgpack is None:
+            raise ValueError(
+                "STORAGE_FORMAT=msgpack (or reading a msgpack file) requires the msgpack package: "
+                "pip install -r requirements-optional.txt"
+            )
+
+    def dumps(self, data: dict) -> bytes:
+        header = BINARY_MAGIC + self.name.encode('ascii') + b"\n"
+        return header + msgpack.packb(data, use_bin_type=True, default=str)
+
+    def loads(self, payload: bytes) -> dict:
+        return msgpack.unpackb(payload, raw=False)
+
+
+SERIALIZERS = {
+    JsonSerializer.name: JsonSerializer,
+    CompactJsonSerializer.name: CompactJsonSerializer,
+    MsgpackSerializer.name: MsgpackSerializer,
+}
+
+_instances: Dict[str, object] = {}
+
+
+def get_serializer(name: str):
+    """Get the serializer for a format name ("json", "json-compact", "msgpack")"""
+    if name not in _instances:
+        if name not in SERIALIZERS:
+            raise ValueError(f"Unknown storage format: {name}")
+        _instances[name] = SERIALIZERS[name]()
+    return _instances[name]
+
+
+def loads(payload: bytes) -> dict:
+    """
+    Decode a file written in any supported format (including legacy JSON).
+    The format marker is removed from the returned dict.
+    """
+    if payload.startswith(BINARY_MAGIC):
+        header, _, body = payload.partition(b"\n")
+        name = header[len(BINARY_MAGIC):].decode('ascii')
+        return get_serializer(name).loads(body)
+
+    data = get_serializer(CompactJsonSerializer.name).loads(payload)
+    data.pop(FORMAT_KEY, None)
+    return data
@@ -0,0 +1,82 @@
+"""
+Singleflight - coalesce identical in-flight async calls.
+
+The first caller for a key starts the work; everyone who asks for the same
+key while it is running awaits the same result instead of repeating it
+(e.g. several users searching venues in the same city at the same time).
+"""
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Per-key deduplication of concurrent coroutines (single event loop)"""
+
+    def __init__(self, max_tracked_keys: int = 256):
+        """
+        Args:
+            max_tracked_keys: Keys kept in the statistics (least recently used dropped)
+        """
+        self.max_tracked_keys = max_tracked_keys
+        self._inflight = {}  # key -> asyncio.Task
+        self._stats = OrderedDict()  # key -> {"label", "executed", "saved"}
+        self._totals = {"executed": 0, "saved": 0}
+
+    def _key_stats(self, key: str, label: Optional[str]) -> dict:
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = {"label": label or key, "executed": 0, "saved": 0}
+            if len(self._stats) > self.max_tracked_keys:
+                self._stats.popitem(last=False)
+        else:
+            self._stats.move_to_end(key)
+        return stats
+
+    async def run(self, key: str, factory: Callable[[], Awaitable], label: Optional[str] = None):
+        """
+        Result of factory() for key, shared with concurrent callers of the same key.
+
+        The work runs in its own task: a caller that is cancelled stops waiting,
+        but the call continues for the others.
+
+        Args:
+            key: Identity of the call (equal keys must mean equal results)
+            factory: Creates the coroutine doing the work
+            label: Human readable key for the statistics
+        """
+        stats = self._key_stats(key, label)
+        task = self._inflight.get(key)
+        if task is None:
+            stats["executed"] += 1
+            self._totals["executed"] += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            stats["saved"] += 1
+            self._totals["saved"] += 1
+            logger.info(f"🔗 Joining in-flight call: {stats['label']}")
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved even if every caller gave up waiting
+
+    def inflight_count(self) -> int:
+        return len(self._inflight)
+
+    def stats(self, top: int = 20) -> dict:
+        """Totals plus the keys that saved the most calls"""
+        keys = sorted(self._stats.values(), key=lambda s: s["saved"], reverse=True)
+        return {
+            "inflight": len(self._inflight),
+            "executed": self._totals["executed"],
+            "saved": self._totals["saved"],
+            "keys": [dict(s) for s in keys[:top] if s["saved"]]
+        }
@@ -0,0 +1,609 @@
+"""
+SQLite storage backend with the same interface as StorageManager.
+Uses the stdlib sqlite3 module in WAL mode with one connection per thread.
+"""
+import json
+import sqlite3
+import threading
+from dataclasses import asdict
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+import logging
+
+from models import (
+    Conversation,
+    ConversationMetadata,
+    Message,
+    MessageRole,
+    PartyPlan,
+    TaskListStorage,
+)
+import serializers
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    status TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    last_message_preview TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_updated_at ON conversations(updated_at);
+
+CREATE TABLE IF NOT EXISTS messages (
+    conversation_id TEXT NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    metadata TEXT,
+    PRIMARY KEY (conversation_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_messages_id ON messages(conversation_id, id);
+
+CREATE TABLE IF NOT EXISTS plans (
+    id TEXT PRIMARY KEY,
+    conversation_id TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_plans_conversation ON plans(conversation_id, updated_at);
+
+CREATE TABLE IF NOT EXISTS task_lists (
+    plan_id TEXT PRIMARY KEY,
+    conversation_id TEXT,
+    data TEXT NOT NULL
+);
+"""
+
+
+class SQLiteStorageManager:
+    """
+    Stores conversations, messages, plans and task lists in a single SQLite
+    database. Drop-in replacement for StorageManager (same public methods).
+    """
+
+    def __init__(self, db_path: str = "database/storage.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.base_path = self.db_path.parent
+        self._local = threading.local()
+        self._listeners = []  # callback(conversation_id, messages) after each append
+
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get the connection for the current thread (created on first use)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30.0)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    # ===== Conversation Storage Methods =====
+
+    def _insert_message(self, conn: sqlite3.Connection, seq: int, data: dict) -> None:
+        """Insert a serialized message (model_dump(mode='json')) at position seq"""
+        conn.execute(
+            "INSERT INTO messages (conversation_id, seq, id, role, content, timestamp, metadata) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                data['conversation_id'],
+                seq,
+                data['id'],
+                data['role'],
+                data['content'],
+                data['timestamp'],
+                json.dumps(data['metadata'], ensure_ascii=False, default=str)
+                if data.get('metadata') is not None else None,
+            )
+        )
+
+    def _row_to_message(self, row: sqlite3.Row) -> Message:
+        """Convert a messages row back to a Message"""
+        return Message(
+            id=row['id'],
+            conversation_id=row['conversation_id'],
+            role=row['role'],
+            content=row['content'],
+            timestamp=row['timestamp'],
+            metadata=json.loads(row['metadata']) if row['metadata'] is not None else None,
+            seq=row['seq']
+        )
+
+    def save_conversation(self, conversation: Conversation) -> bool:
+        """
+        Save a full conversation (replaces all of its messages in one transaction).
+        Returns True on success, False on failure.
+        """
+        try:
+            data = conversation.model_dump(mode='json')
+            messages = data['messages']
+            conn = self._connect()
+
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO conversations "
+                    "(id, title, created_at, updated_at, status, message_count, last_message_preview) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        data['id'],
+                        data['title'],
+                        data['created_at'],
+                        data['updated_at'],
+                        data['status'],
+                        len(messages),
+                        messages[-1]['content'][:100] if messages else None,
+                    )
+                )
+                conn.execute("DELETE FROM messages WHERE conversation_id = ?", (data['id'],))
+                for seq, message in enumerate(messages):
+                    self._insert_message(conn, seq, message)
+
+            logger.info(f"Saved conversation {conversation.id}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to save conversation {conversation.id}: {e}")
+            return False
+
+    def load_conversation(self, conversation_id: str) -> Optional[Conversation]:
+        """
+        Load a conversation with all messages.
+        Returns None if not found or error occurs.
+        """
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT * FROM conversations WHERE id = ?", (conversation_id,)
+            ).fetchone()
+            if row is None:
+                logger.warning(f"Conversation {conversation_id} not found")
+                return None
+
+            rows = conn.execute(
+                "SELECT * FROM messages WHERE conversation_id = ? ORDER BY seq",
+                (conversation_id,)
+            ).fetchall()
+
+            conversation = Conversation(
+                id=row['id'],
+                title=row['title'],
+                messages=[self._row_to_message(r) for r in rows],
+                created_at=row['created_at'],
+                updated_at=row['updated_at'],
+                status=row['status']
+            )
+            logger.info(f"Loaded conversation {conversation_id}")
+            return conversation
+
+        except Exception as e:
+            logger.error(f"Failed to load conversation {conversation_id}: {e}")
+            return None
+
+    def load_messages(
+        self,
+        conversation_id: str,
+        limit: int = 50,
+        offset: int = 0,
+        newest_first: bool = False
+    ) -> Optional[List[Message]]:
+        """
+        Load a window of messages (uses the (conversation_id, seq) primary key).
+        offset counts from the oldest message, or from the newest one if newest_first.
+        Returns None if not found or error occurs.
+        """
+        try:
+            conn = self._connect()
+            if not self.conversation_exists(conversation_id):
+                logger.warning(f"Conversation {conversation_id} not found")
+                return None
+
+            order = "DESC" if newest_first else "ASC"
+            rows = conn.execute(
+                f"SELECT * FROM messages WHERE conversation_id = ? ORDER BY seq {order} LIMIT ? OFFSET ?",
+                (conversation_id, limit, offset)
+            ).fetchall()
+            return [self._row_to_message(r) for r in rows]
+
+        except Exception as e:
+            logger.error(f"Failed to load messages for conversation {conversation_id}: {e}")
+            return None
+
+    def find_message_seq(self, conversation_id: str, message_id: str) -> Optional[int]:
+        """Get the seq of a message by its id, or None if not found"""
+        try:
+            row = self._connect().execute(
+                "SELECT seq FROM messages WHERE conversation_id = ? AND id = ?",
+                (conversation_id, message_id)
+            ).fetchone()
+            return row['seq'] if row is not None else None
+
+        except Exception as e:
+            logger.error(f"Failed to find message {message_id} in conversation {conversation_id}: {e}")
+            return None
+
+    def list_conversations(self) -> List[ConversationMetadata]:
+        """
+        List all conversations with metadata (without full message history).
+        Returns list sorted by updated_at (newest first).
+        """
+        try:
+            rows = self._connect().execute(
+                "SELECT * FROM conversations ORDER BY updated_at DESC"
+            ).fetchall()
+            conversations = [ConversationMetadata(**dict(row)) for row in rows]
+            logger.info(f"Listed {len(conversations)} conversations")
+            return conversations
+
+        except Exception as e:
+            logger.error(f"Failed to list conversations: {e}")
+            return []
+
+    def delete_conversation(self, conversation_id: str) -> bool:
+        """
+        Delete a conversation and its messages.
+        Returns True on success, False on failure.
+        """
+        try:
+            conn = self._connect()
+            with conn:
+                cursor = conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+            if cursor.rowcount == 0:
+                logger.warning(f"Conversation {conversation_id} not found for deletion")
+                return False
+
+            logger.info(f"Deleted conversation {conversation_id}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to delete conversation {conversation_id}: {e}")
+            return False
+
+    def add_message_to_conversation(self, conversation_id: str, message: Message) -> bool:
+        """
+        Add a message to an existing conversation (single transaction).
+        Returns True on success, False on failure.
+        """
+        return self.add_messages_to_conversation(conversation_id, [message])
+
+    def add_messages_to_conversation(self, conversation_id: str, messages: List[Message]) -> bool:
+        """
+        Append several messages to an existing conversation in one transaction.
+        Returns True on success, False on failure.
+        """
+        if not messages:
+            return True
+
+        try:
+            conn = self._connect()
+            with conn:
+                # Take the write lock before reading message_count, so concurrent
+                # writers (threads or processes) cannot pick the same seq
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute(
+                    "SELECT title, message_count FROM conversations WHERE id = ?",
+                    (conversation_id,)
+                ).fetchone()
+                if row is None:
+                    logger.error(f"Conversation {conversation_id} not found")
+                    return False
+
+                message_count = row['message_count']
+                title = row['title']
+                for message in messages:
+                    message.seq = message_count
+                    self._insert_message(conn, message_count, message.model_dump(mode='json'))
+                    message_count += 1
+                    # Update title if it's the first user message and no title set
+                    if not title and message.role == MessageRole.USER and message_count <= 2:
+                        title = message.content[:50] + ("..." if len(message.content) > 50 else "")
+
+                conn.execute(
+                    "UPDATE conversations SET title = ?, updated_at = ?, message_count = ?, "
+                    "last_message_preview = ? WHERE id = ?",
+                    (
+                        title,
+                        datetime.now().isoformat(),
+                        message_count,
+                        messages[-1].content[:100],
+                        conversation_id,
+                    )
+                )
+
+            logger.info(f"Added {len(messages)} message(s) to conversation {conversation_id}")
+            self._notify_listeners(conversation_id, messages)
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to add messages to conversation {conversation_id}: {e}")
+            return False
+
+    def conversation_exists(self, conversation_id: str) -> bool:
+        """Check if a conversation exists"""
+        row = self._connect().execute(
+            "SELECT 1 FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        return row is not None
+
+    def cache_stats(self) -> dict:
+        """SQLite backend has no conversation cache (kept for interface parity)"""
+        return {"size": 0, "capacity": 0, "hits": 0, "misses": 0}
+
+    def lock_count(self) -> int:
+        """SQLite serializes writers itself - no per-key locks (kept for interface parity)"""
+        return 0
+
+    def add_listener(self, callback) -> None:
+        """Register callback(conversation_id, messages), called on the writing thread after each append"""
+        self._listeners.append(callback)
+
+    def _notify_listeners(self, conversation_id: str, messages: List[Message]) -> None:
+        """Call the append listeners; a failing listener never fails the write"""
+        for callback in self._listeners:
+            try:
+                callback(conversation_id, messages)
+            except Exception as e:
+                logger.error(f"Message listener failed for conversation {conversation_id}: {e}")
+
+    # ===== Party Plan Storage Methods =====
+
+    def save_plan(self, plan) -> bool:
+        """
+        Save a party plan
+
+        Args:
+            plan: PartyPlan object
+
+        Returns:
+            True on success, False on failure
+        """
+        try:
+            data = plan.model_dump(mode='json')
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO plans (id, conversation_id, updated_at, data) "
+                    "VALUES (?, ?, ?, ?)",
+                    (
+                        data['id'],
+                        data['conversation_id'],
+                        data['updated_at'],
+                        json.dumps(data, ensure_ascii=False, default=str),
+                    )
+                )
+
+            logger.info(f"Saved plan {plan.id}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to save plan {plan.id}: {e}")
+            return False
+
+    def load_plan(self, plan_id: str):
+        """
+        Load a party plan
+
+        Args:
+            plan_id: ID of the plan
+
+        Returns:
+            PartyPlan object or None if not found
+        """
+        try:
+            row = self._connect().execute(
+                "SELECT data FROM plans WHERE id = ?", (plan_id,)
+            ).fetchone()
+            if row is None:
+                logger.warning(f"Plan {plan_id} not found")
+                return None
+
+            plan = PartyPlan(**json.loads(row['data']))
+            logger.info(f"Loaded plan {plan_id}")
+            return plan
+
+        except Exception as e:
+            logger.error(f"Failed to load plan {plan_id}: {e}")
+            return None
+
+    def get_plan_by_conversation(self, conversation_id: str):
+        """
+        Get the most recently updated party plan of a conversation
+
+        Args:
+            conversation_id: ID of the conversation
+
+        Returns:
+            PartyPlan object or None if not found
+        """
+        try:
+            row = self._connect().execute(
+                "SELECT data FROM plans WHERE conversation_id = ? "
+                "ORDER BY updated_at DESC LIMIT 1",
+                (conversation_id,)
+            ).fetchone()
+            if row is None:
+                logger.info(f"No plan found for conversation {conversation_id}")
+                return None
+
+            logger.info(f"Found plan for conversation {conversation_id}")
+            return PartyPlan(**json.loads(row['data']))
+
+        except Exception as e:
+            logger.error(f"Failed to get plan by conversation {conversation_id}: {e}")
+            return None
+
+    def delete_plan(self, plan_id: str) -> bool:
+        """
+        Delete a party plan
+
+        Args:
+            plan_id: ID of the plan
+
+        Returns:
+            True on success, False on failure
+        """
+        try:
+            conn = self._connect()
+            with conn:
+                cursor = conn.execute("DELETE FROM plans WHERE id = ?", (plan_id,))
+
+            if cursor.rowcount == 0:
+                logger.warning(f"Plan {plan_id} not found for deletion")
+                return False
+
+            logger.info(f"Deleted plan {plan_id}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to delete plan {plan_id}: {e}")
+            return False
+
+    # ===== Task List Storage Methods =====
+
+    def save_task_list(self, tasks: list, plan_id: str, conversation_id: str = "") -> bool:
+        """
+        Save task list
+
+        Args:
+            tasks: List of Task objects (from task.py)
+            plan_id: ID of the associated plan
+            conversation_id: ID of the conversation
+
+        Returns:
+            True on success, False on failure
+        """
+        try:
+            task_list_storage = TaskListStorage(
+                plan_id=plan_id,
+                conversation_id=conversation_id,
+                created_at=datetime.now(),
+                tasks=[asdict(task) for task in tasks],
+                status="pending"
+            )
+            self._write_task_list(task_list_storage.model_dump(mode='json'))
+
+            logger.info(f"Saved task list for plan {plan_id} ({len(tasks)} tasks)")
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to save task list for plan {plan_id}: {e}")
+            return False
+
+    def _write_task_list(self, data: dict) -> None:
+        """Insert or replace a serialized TaskListStorage"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO task_lists (plan_id, conversation_id, data) VALUES (?, ?, ?)",
+                (data['plan_id'], data['conversation_id'], json.dumps(data, ensure_ascii=False, default=str))
+            )
+
+    def load_task_list(self, plan_id: str) -> Optional[list]:
+        """
+        Load task list
+
+        Args:
+            plan_id: ID of the plan
+
+        Returns:
+            List of Task objects or None if not found
+        """
+        from task import Task, Place
+
+        try:
+            row = self._connect().execute(
+                "SELECT data FROM task_lists WHERE plan_id = ?", (plan_id,)
+            ).fetchone()
+            if row is None:
+                logger.warning(f"Task list for plan {plan_id} not found")
+                return None
+
+            tasks = [
+                Task(
+                    task_id=t["task_id"],
+                    notes_for_agent=t["notes_for_agent"],
+                    places=[Place(name=p["name"], phone=p["phone"]) for p in t["places"]]
+                )
+                for t in json.loads(row['data']).get('tasks', [])
+            ]
+
+            logger.info(f"Loaded task list for plan {plan_id} ({len(tasks)} tasks)")
+            return tasks
+
+        except Exception as e:
+            logger.error(f"Failed to load task list for plan {plan_id}: {e}")
+            return None
+
+    # ===== Migration =====
+
+    def migrate_from_json(self, source) -> dict:
+        """
+        One-shot import of the JSON file layout (conversations, plans, task lists).
+        Entities that already exist in the database are skipped.
+
+        Args:
+            source: StorageManager reading the existing database/ directory
+
+        Returns:
+            Dict with number of migrated conversations, plans and task lists
+        """
+        counts = {"conversations": 0, "plans": 0, "task_lists": 0}
+        conn = self._connect()
+
+        for metadata in source.list_conversations():
+            if self.conversation_exists(metadata.id):
+                continue
+            conversation = source.load_conversation(metadata.id)
+            if conversation and self.save_conversation(conversation):
+                counts["conversations"] += 1
+
+        for file_path in source.iter_files(source.plans_path, "plan"):
+            try:
+                plan = PartyPlan(**serializers.loads(file_path.read_bytes()))
+                if conn.execute("SELECT 1 FROM plans WHERE id = ?", (plan.id,)).fetchone():
+                    continue
+                if self.save_plan(plan):
+                    counts["plans"] += 1
+            except Exception as e:
+                logger.error(f"Failed to migrate plan from {file_path}: {e}")
+
+        for file_path in source.iter_files(source.tasks_path, "tasks"):
+            try:
+                data = TaskListStorage(**serializers.loads(file_path.read_bytes())).model_dump(mode='json')
+                if conn.execute("SELECT 1 FROM task_lists WHERE plan_id = ?", (data['plan_id'],)).fetchone():
+                    continue
+                self._write_task_list(data)
+                counts["task_lists"] += 1
+            except Exception as e:
+                logger.error(f"Failed to migrate task list from {file_path}: {e}")
+
+        logger.info(
+            f"Migrated {counts['conversations']} conversations, {counts['plans']} plans "
+            f"and {counts['task_lists']} task lists to {self.db_path}"
+        )
+        return counts
+
+
+if __name__ == "__main__":
+    import sys
+    from storage_manager import StorageManager
+
+    # Usage: python sqlite_storage.py [json_conversations_dir] [db_path]
+    json_dir = sys.argv[1] if len(sys.argv) > 1 else "database/conversations"
+    db_path = sys.argv[2] if len(sys.argv) > 2 else "database/storage.db"
+    logging.basicConfig(level=logging.INFO)
+    print(SQLiteStorageManager(db_path).migrate_from_json(StorageManager(json_dir)))
@@ -0,0 +1,198 @@
+"""
+Persistent key -> value indexes used by StorageManager.
+Each index is kept in memory and backed by an append-only NDJSON journal on disk.
+"""
+import json
+import os
+import threading
+from pathlib import Path
+from contextlib import nullcontext
+from typing import Any, Callable, Dict
+import logging
+
+from lock_registry import flock
+
+logger = logging.getLogger(__name__)
+
+
+class JournalIndex:
+    """
+    Persistent dictionary backed by an append-only NDJSON journal.
+
+    Every update appends one line ({"k": key, "v": value} or {"k": key, "d": 1}),
+    so writes cost O(1) regardless of index size. When the journal grows to
+    more than twice the number of live entries it is compacted (rewritten
+    atomically with only the live entries). If the journal file is missing,
+    the index is rebuilt with the `rebuild` callback and written out.
+
+    With shared=True the journal may be written by several processes: every
+    access takes an fcntl lock on `<journal>.lock` and first replays records
+    appended by other processes (or reloads after another process compacted).
+
+    With durable=False appends are not fsynced (other processes still see them
+    at once) until sync() is called; a power loss may drop the updates since
+    then, so use it only for entries that are rewritten in full on every change.
+    """
+
+    MIN_COMPACT_LENGTH = 64
+
+    def __init__(
+        self,
+        path: Path,
+        rebuild: Callable[[], Dict[str, Any]],
+        shared: bool = False,
+        durable: bool = True
+    ):
+        """
+        Args:
+            path: Journal file path
+            rebuild: Callback returning the full index, used when the journal is missing
+            shared: Journal is shared with other processes (cross-process locking)
+            durable: fsync every appended record
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.shared = shared
+        self.durable = durable
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Any] = {}
+        self._journal_length = 0
+        self._inode = None  # Journal file identity and replayed size (shared mode)
+        self._offset = 0
+
+        with self._locked(shared=False):
+            if self.path.exists():
+                self._load()
+            else:
+                logger.info(f"Index {self.path} missing, rebuilding...")
+                self._entries = rebuild()
+                self._compact()
+                logger.info(f"Rebuilt index {self.path} ({len(self._entries)} entries)")
+
+    def _locked(self, shared: bool):
+        """Cross-process lock on the journal (no-op unless the index is shared)"""
+        if not self.shared:
+            return nullcontext()
+        return flock(self.path.with_suffix(self.path.suffix + '.lock'), shared=shared)
+
+    def _load(self) -> None:
+        """Replay the journal into memory"""
+        self._entries = {}
+        self._journal_length = 0
+        self._offset = 0
+        self._inode = os.stat(self.path).st_ino
+        self._replay()
+
+    def _replay(self) -> None:
+        """Apply journal records after the replayed offset (complete lines only)"""
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].split(b"\n"):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping corrupt line in index {self.path}")
+                continue
+            self._apply(record)
+            self._journal_length += 1
+        self._offset += end
+
+    def _refresh(self) -> None:
+        """Pick up changes made by other processes (caller holds the locks)"""
+        if not self.shared:
+            return
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            self._load()  # Compacted (replaced) by another process
+        elif stat.st_size > self._offset:
+            self._replay()
+
+    def _apply(self, record: dict) -> None:
+        """Apply a single journal record to the in-memory entries"""
+        if record.get("d"):
+            self._entries.pop(record["k"], None)
+        else:
+            self._entries[record["k"]] = record["v"]
+
+    def _append(self, record: dict) -> None:
+        """Append a record to the journal and apply it (caller holds the lock)"""
+        line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode('utf-8')
+        with open(self.path, 'ab') as f:
+            f.write(line)
+            if self.durable:
+                f.flush()
+                os.fsync(f.fileno())
+        self._apply(record)
+        self._journal_length += 1
+        self._offset += len(line)
+
+        if self._journal_length > max(self.MIN_COMPACT_LENGTH, 2 * len(self._entries)):
+            self._compact()
+
+    def sync(self) -> None:
+        """fsync the journal (makes appends of a non-durable index durable)"""
+        with self._lock:
+            if not self.path.exists():
+                return
+            with open(self.path, 'rb') as f:
+                os.fsync(f.fileno())
+
+    def _compact(self) -> None:
+        """Rewrite the journal with only the live entries (caller holds the lock)"""
+        temp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        with open(temp_path, 'wb') as f:
+            for key, value in self._entries.items():
+                record = {"k": key, "v": value}
+                f.write((json.dumps(record, ensure_ascii=False, default=str) + "\n").encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        temp_path.replace(self.path)
+        self._journal_length = len(self._entries)
+        stat = os.stat(self.path)
+        self._inode, self._offset = stat.st_ino, stat.st_size
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get the value for key"""
+        with self._lock, self._locked(shared=True):
+            self._refresh()
+            return self._entries.get(key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        """Set the value for key (no-op if unchanged)"""
+        with self._lock, self._locked(shared=False):
+            self._refresh()
+            if self._entries.get(key) == value:
+                return
+            self._append({"k": key, "v": value})
+
+    def delete(self, key: str) -> None:
+        """Remove key from the index (no-op if absent)"""
+        with self._lock, self._locked(shared=False):
+            self._refresh()
+            if key not in self._entries:
+                return
+            self._append({"k": key, "d": 1})
+
+    def values(self) -> list:
+        """Snapshot of all values"""
+        with self._lock, self._locked(shared=True):
+            self._refresh()
+            return list(self._entries.values())
+
+    def __len__(self) -> int:
+        with self._lock, self._locked(shared=True):
+            self._refresh()
+            return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock, self._locked(shared=True):
+            self._refresh()
+            return key in self._entries
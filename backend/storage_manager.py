@@ -2,128 +2,742 @@
 Storage Manager for handling JSON-based conversation persistence.
 Thread-safe operations for reading/writing conversation data.
 """
+import hashlib
 import json
 import os
 import threading
-from typing import List, Optional
+from collections import OrderedDict
+from typing import Iterator, List, Optional, Tuple
 from datetime import datetime
 from pathlib import Path
 import logging
+from dotenv import load_dotenv
 
-from models import Conversation, Message, ConversationMetadata, ConversationStatus, MessageRole
+from models import Conversation, Message, ConversationMetadata, MessageRole
+from lock_registry import FileLockRegistry, LockRegistry
+from storage_index import JournalIndex
+import serializers
+
+load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 class StorageManager:
-    """Manages JSON file storage for conversations"""
+    """
+    Manages JSON file storage for conversations.
+
+    Each conversation is stored as two files:
+    - conversation_<id>.json - small header (title, timestamps, status) with a
+      checkpoint of the message log (message count, log offset, last preview)
+    - conversation_<id>.log - append-only NDJSON log, one message per line
+
+    Appending a message writes a single line to the log, so its cost does not
+    depend on the conversation length. Every `compact_every` appends the header
+    is compacted: the log entries written since the last checkpoint are folded
+    into it, keeping metadata reads bounded. Legacy files that store messages
+    inline in the JSON file are still read, and their messages are moved into
+    the log on the first compaction.
+
+    Loaded conversations are kept in a bounded LRU cache. A cache entry is valid
+    while the header and log files are unchanged (mtime and size), so writes
+    from this or any other process invalidate it.
+
+    With locking="fcntl" every per-key lock is also an fcntl advisory lock on a
+    file under <base_path>/.locks, cached append state is re-validated against
+    the file stamps and the indexes replay each other's journal records, so
+    several processes (uvicorn --workers N) can safely share one directory.
+
+    With layout="sharded" (default) files live in two-level hex prefix
+    directories (<dir>/ab/cd/conversation_<id>.json, from a hash of the id), so
+    no directory grows beyond a few files. Files still in the old flat layout
+    are found as a fallback and can be moved with migrate_layout() while the
+    server is running.
+    """
     
-    def __init__(self, base_path: str = "database/conversations"):
+    LOG_READ_CHUNK = 64 * 1024  # Bytes per step when reading a message log backwards
+    LOG_STATE_CAPACITY = 1024  # Conversations whose append state is kept (LRU)
+    PATH_CACHE_CAPACITY = 4096  # Resolved sharded-layout file paths kept (LRU)
+    
+    def __init__(
+        self,
+        base_path: str = "database/conversations",
+        compact_every: int = 32,
+        cache_size: int = 128,
+        storage_format: str = "json-compact",
+        locking: str = "thread",
+        layout: str = "sharded"
+    ):
+        """
+        Args:
+            base_path: Directory for conversation files
+            compact_every: Appends between header checkpoints
+            cache_size: Capacity of the loaded-conversation LRU cache
+            storage_format: Format for new files ("json-compact", "json", "msgpack")
+            locking: "thread" (single process) or "fcntl" (safe for multiple processes)
+            layout: "sharded" (hash prefix directories) or "flat"
+        """
+        if locking not in ("thread", "fcntl"):
+            raise ValueError(f"Unknown STORAGE_LOCKING: {locking}")
+        if layout not in ("sharded", "flat"):
+            raise ValueError(f"Unknown STORAGE_LAYOUT: {layout}")
         self.base_path = Path(base_path)
+        self.plans_path = self.base_path.parent / "plans"
+        self.tasks_path = self.base_path.parent / "tasks"
+        self.layout = layout
+        # Format for new headers, plans and task lists; any format is readable
+        self._serializer = serializers.get_serializer(storage_format)
         self.base_path.mkdir(parents=True, exist_ok=True)
-        self._locks = {}  # conversation_id -> Lock
-        self._global_lock = threading.Lock()
+        self.plans_path.mkdir(parents=True, exist_ok=True)
+        self.tasks_path.mkdir(parents=True, exist_ok=True)
+        self.compact_every = compact_every
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # conversation_id -> (file stamp, Conversation)
+        self._cache_lock = threading.Lock()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self.shared = locking == "fcntl"
+        # conversation_id / plan_<id> / tasks_<id> -> Lock
+        if self.shared:
+            self._locks = FileLockRegistry(self.base_path / ".locks")
+        else:
+            self._locks = LockRegistry()
+        # conversation_id -> {"message_count", "title", "pending", "stamp"}, LRU bounded by
+        # LOG_STATE_CAPACITY (an evicted state is read from disk again on the next append)
+        self._log_states = OrderedDict()
+        self._log_states_lock = threading.Lock()
+        # (directory, filename) -> resolved Path of an existing file in the sharded layout.
+        # Not used with locking="fcntl", where another process may migrate or delete files
+        self._paths = OrderedDict()
+        self._paths_lock = threading.Lock()
+        self._listeners = []  # callback(conversation_id, messages) after each append
+        
+        # conversation_id -> ConversationMetadata fields, maintained on every write.
+        # Not fsynced per append (the message log is) - synced at header checkpoints
+        self._metadata_index = JournalIndex(
+            self.base_path / "metadata_index.ndjson",
+            rebuild=self._scan_metadata_index,
+            shared=self.shared,
+            durable=False
+        )
         
-    def _get_lock(self, conversation_id: str) -> threading.Lock:
-        """Get or create a lock for a specific conversation"""
-        with self._global_lock:
-            if conversation_id not in self._locks:
-                self._locks[conversation_id] = threading.Lock()
-            return self._locks[conversation_id]
+        # conversation_id -> plan_id, maintained by save_plan/delete_plan
+        self._plan_index = JournalIndex(
+            self.plans_path / "conversation_index.ndjson",
+            rebuild=self._scan_plan_index,
+            shared=self.shared
+        )
+        
+    def lock_count(self) -> int:
+        """Number of live per-key locks (idle locks are released automatically)"""
+        return len(self._locks)
+    
+    def add_listener(self, callback) -> None:
+        """
+        Register callback(conversation_id, messages), called after messages are
+        appended to a conversation. It runs on the writing thread, so it must be
+        quick and thread-safe.
+        """
+        self._listeners.append(callback)
+    
+    def _notify_listeners(self, conversation_id: str, messages: List[Message]) -> None:
+        """Call the append listeners; a failing listener never fails the write"""
+        for callback in self._listeners:
+            try:
+                callback(conversation_id, messages)
+            except Exception as e:
+                logger.error(f"Message listener failed for conversation {conversation_id}: {e}")
+    
+    def _shard_dir(self, directory: Path, key: str) -> Path:
+        """Two-level shard directory for a key, e.g. <directory>/3f/a2"""
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return directory / digest[:2] / digest[2:4]
+    
+    def _resolve_path(self, directory: Path, key: str, filename: str) -> Path:
+        """
+        Path of a stored file in the configured layout. In the sharded layout a
+        file not migrated yet is still used at its flat location.
+        """
+        flat_path = directory / filename
+        if self.layout == "flat":
+            return flat_path
+        
+        memo_key = (directory, filename)
+        with self._paths_lock:
+            path = self._paths.get(memo_key)
+            if path is not None:
+                self._paths.move_to_end(memo_key)
+                return path
+        
+        sharded_path = self._shard_dir(directory, key) / filename
+        if sharded_path.exists():
+            path = sharded_path
+        elif flat_path.exists():
+            path = flat_path
+        else:
+            return sharded_path  # Not stored yet, new files go to the shard
+        
+        if not self.shared:
+            with self._paths_lock:
+                self._paths[memo_key] = path
+                while len(self._paths) > self.PATH_CACHE_CAPACITY:
+                    self._paths.popitem(last=False)
+        return path
+    
+    def _forget_path(self, directory: Path, filename: str) -> None:
+        """Drop a memoized path after its file was moved or deleted"""
+        with self._paths_lock:
+            self._paths.pop((directory, filename), None)
+    
+    def iter_files(self, directory: Path, prefix: str) -> Iterator[Path]:
+        """Yield every "<prefix>_*.json" file under directory (flat and sharded)"""
+        yield from directory.glob(f"{prefix}_*.json")
+        yield from directory.glob(f"??/??/{prefix}_*.json")
     
     def _get_file_path(self, conversation_id: str) -> Path:
-        """Get the file path for a conversation"""
-        return self.base_path / f"conversation_{conversation_id}.json"
+        """Get the file path for a conversation header"""
+        return self._resolve_path(self.base_path, conversation_id, f"conversation_{conversation_id}.json")
+    
+    def _get_log_path(self, conversation_id: str) -> Path:
+        """Get the file path for a conversation message log (next to its header)"""
+        return self._get_file_path(conversation_id).with_suffix(".log")
+    
+    def _write_atomic(self, file_path: Path, payload: bytes) -> None:
+        """Write payload to a temp file, fsync it and rename it over file_path"""
+        temp_path = file_path.with_suffix(file_path.suffix + '.tmp')
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(payload)
+                f.flush()  # Ensure data is written to disk
+                os.fsync(f.fileno())  # Force write to disk
+            
+            # Rename temp file to actual file (atomic on POSIX systems)
+            temp_path.replace(file_path)
+        except Exception:
+            # Clean up temp file if it exists
+            if temp_path.exists():
+                temp_path.unlink()
+            raise
+    
+    def _encode_log_record(self, record: dict) -> bytes:
+        """Encode a single message log record as one NDJSON line"""
+        return (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode('utf-8')
+    
+    def _read_log_records(self, conversation_id: str, offset: int = 0) -> List[dict]:
+        """
+        Read message log records starting at byte offset.
+        A torn last line (e.g. after a crash mid-append) is skipped.
+        """
+        log_path = self._get_log_path(conversation_id)
+        if not log_path.exists():
+            return []
+        
+        with open(log_path, 'rb') as f:
+            f.seek(offset)
+            lines = f.read().split(b"\n")
+        
+        records = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping corrupt log line in conversation {conversation_id}")
+        return records
+    
+    def _read_header(self, conversation_id: str) -> Optional[dict]:
+        """Read the conversation header file, or None if it does not exist"""
+        file_path = self._get_file_path(conversation_id)
+        if not file_path.exists():
+            return None
+        return serializers.loads(file_path.read_bytes())
+    
+    def _read_metadata(self, conversation_id: str) -> Optional[dict]:
+        """
+        Read conversation metadata from the header checkpoint plus the log
+        entries written after it (bounded by compact_every).
+        
+        Returns dict with header fields plus message_count, last_message_preview
+        and pending (log entries since the last checkpoint), or None if not found.
+        """
+        header = self._read_header(conversation_id)
+        if header is None:
+            return None
+        
+        inline_messages = header.get('messages', [])
+        message_count = header.get('message_count', len(inline_messages))
+        last_preview = header.get('last_message_preview')
+        if 'message_count' not in header and inline_messages:
+            last_preview = inline_messages[-1]['content'][:100]
+        
+        tail = self._read_log_records(conversation_id, header.get('log_offset', 0))
+        for record in tail:
+            self._apply_log_record(header, record)
+            message_count += 1
+            last_preview = record['message']['content'][:100]
+        
+        header['message_count'] = message_count
+        header['last_message_preview'] = last_preview
+        header['pending'] = len(tail)
+        return header
+    
+    def _apply_log_record(self, data: dict, record: dict) -> None:
+        """Apply header changes carried by a log record (updated_at, title)"""
+        if record.get('updated_at'):
+            data['updated_at'] = record['updated_at']
+        if record.get('title'):
+            data['title'] = record['title']
+    
+    def _log_state_get(self, conversation_id: str) -> Optional[dict]:
+        """Cached append state of a conversation, marked as recently used"""
+        with self._log_states_lock:
+            state = self._log_states.get(conversation_id)
+            if state is not None:
+                self._log_states.move_to_end(conversation_id)
+            return state
+    
+    def _log_state_put(self, conversation_id: str, state: dict) -> None:
+        """Store an append state, evicting the least recently used ones"""
+        with self._log_states_lock:
+            self._log_states[conversation_id] = state
+            self._log_states.move_to_end(conversation_id)
+            while len(self._log_states) > self.LOG_STATE_CAPACITY:
+                self._log_states.popitem(last=False)
+    
+    def _log_state_drop(self, conversation_id: str) -> None:
+        with self._log_states_lock:
+            self._log_states.pop(conversation_id, None)
+    
+    def _get_log_state(self, conversation_id: str) -> Optional[dict]:
+        """Get cached append state for a conversation (caller holds the lock)"""
+        state = self._log_state_get(conversation_id)
+        if state is not None and self.shared and state["stamp"] != self._file_stamp(conversation_id):
+            state = None  # Files were changed by another process
+        if state is None:
+            metadata = self._read_metadata(conversation_id)
+            if metadata is None:
+                return None
+            self._repair_log_tail(conversation_id)
+            state = {
+                "message_count": metadata['message_count'],
+                "title": metadata.get('title'),
+                "pending": metadata['pending'],
+                "stamp": self._file_stamp(conversation_id),
+            }
+            self._log_state_put(conversation_id, state)
+        return state
+    
+    def _repair_log_tail(self, conversation_id: str) -> None:
+        """
+        Truncate a torn last line (e.g. after a crash mid-append) so the next
+        append starts on a fresh line instead of being glued to it.
+        Caller holds the lock.
+        """
+        log_path = self._get_log_path(conversation_id)
+        if not log_path.exists():
+            return
+        
+        with open(log_path, 'r+b') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            
+            # Find the end of the last complete line, reading backwards in chunks
+            position = size
+            end = 0
+            while position > 0:
+                chunk = min(self.LOG_READ_CHUNK, position)
+                position -= chunk
+                f.seek(position)
+                newline = f.read(chunk).rfind(b"\n")
+                if newline != -1:
+                    end = position + newline + 1
+                    break
+            
+            f.truncate(end)
+            f.flush()
+            os.fsync(f.fileno())
+        logger.warning(f"Dropped {size - end} byte(s) of a torn log line in conversation {conversation_id}")
+    
+    def _compact(self, conversation_id: str) -> None:
+        """
+        Fold log entries written since the last checkpoint into the header.
+        Legacy inline messages are moved into the log. Caller holds the lock.
+        """
+        metadata = self._read_metadata(conversation_id)
+        if metadata is None:
+            return
+        
+        log_path = self._get_log_path(conversation_id)
+        inline_messages = metadata.get('messages', [])
+        if inline_messages:
+            # One-time migration of legacy inline messages into the log
+            inline_ids = {m['id'] for m in inline_messages}
+            records = [{"message": m} for m in inline_messages]
+            records += [
+                r for r in self._read_log_records(conversation_id)
+                if r['message']['id'] not in inline_ids
+            ]
+            self._write_atomic(log_path, b"".join(self._encode_log_record(r) for r in records))
+            metadata['message_count'] = len(records)
+        
+        metadata['messages'] = []
+        metadata['log_offset'] = log_path.stat().st_size if log_path.exists() else 0
+        metadata.pop('pending', None)
+        self._write_atomic(
+            self._get_file_path(conversation_id),
+            self._serializer.dumps(metadata)
+        )
+        
+        self._metadata_index.sync()
+        
+        state = self._log_state_get(conversation_id)
+        if state is not None:
+            state["pending"] = 0
+        logger.info(f"Compacted conversation {conversation_id} ({metadata['message_count']} messages)")
+    
+    def _metadata_entry(self, data: dict) -> dict:
+        """Build a metadata index entry from header/metadata fields"""
+        return {
+            "id": data['id'],
+            "title": data.get('title'),
+            "created_at": data['created_at'],
+            "updated_at": data['updated_at'],
+            "status": data.get('status', 'active'),
+            "message_count": data['message_count'],
+            "last_message_preview": data.get('last_message_preview'),
+        }
+    
+    def _scan_metadata_index(self) -> dict:
+        """Build the metadata index by reading every conversation header (and log tail)"""
+        index = {}
+        for file_path in self.iter_files(self.base_path, "conversation"):
+            try:
+                conversation_id = file_path.stem[len("conversation_"):]
+                data = self._read_metadata(conversation_id)
+                if data is not None:
+                    index[conversation_id] = self._metadata_entry(data)
+            except Exception as e:
+                logger.error(f"Failed to load metadata from {file_path}: {e}")
+                continue
+        return index
     
     def save_conversation(self, conversation: Conversation) -> bool:
         """
-        Save a conversation to disk with file locking to prevent race conditions.
+        Save a full conversation to disk (rewrites both header and message log).
         Returns True on success, False on failure.
         """
-        lock = self._get_lock(conversation.id)
-        file_path = self._get_file_path(conversation.id)
-        temp_path = file_path.with_suffix('.tmp')
-        
         try:
-            with lock:
+            with self._locks.hold(conversation.id):
+                # Resolved under the lock - migrate_layout may move the files
+                file_path = self._get_file_path(conversation.id)
+                log_path = self._get_log_path(conversation.id)
+                
                 # Convert to dict for JSON serialization
                 data = conversation.model_dump(mode='json')
+                messages = data.pop('messages')
+                for seq, message in enumerate(messages):
+                    message['seq'] = seq
+                
+                # Write the message log first, header last - a crash in between
+                # leaves a readable (possibly stale) header
+                log_payload = b"".join(self._encode_log_record({"message": m}) for m in messages)
+                self._write_atomic(log_path, log_payload)
                 
-                # Write to temp file first (atomic operation)
-                with open(temp_path, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, indent=2, ensure_ascii=False, default=str)
-                    f.flush()  # Ensure data is written to disk
-                    os.fsync(f.fileno())  # Force write to disk
+                data['messages'] = []
+                data['message_count'] = len(messages)
+                data['log_offset'] = len(log_payload)
+                data['last_message_preview'] = messages[-1]['content'][:100] if messages else None
+                self._write_atomic(
+                    file_path,
+                    self._serializer.dumps(data)
+                )
                 
-                # Rename temp file to actual file (atomic on POSIX systems)
-                temp_path.replace(file_path)
+                self._log_state_put(conversation.id, {
+                    "message_count": len(messages),
+                    "title": conversation.title,
+                    "pending": 0,
+                    "stamp": self._file_stamp(conversation.id),
+                })
+                self._metadata_index.set(conversation.id, self._metadata_entry(data))
                 
                 logger.info(f"Saved conversation {conversation.id}")
                 return True
                 
         except Exception as e:
             logger.error(f"Failed to save conversation {conversation.id}: {e}")
-            # Clean up temp file if it exists
-            if temp_path.exists():
-                temp_path.unlink()
+            self._log_state_drop(conversation.id)
             return False
     
+    def _file_stamp(self, conversation_id: str) -> Optional[Tuple[int, ...]]:
+        """
+        Version stamp of a conversation's files (inode, mtime and size of header
+        and log - the inode changes on every atomic replace, even one that keeps
+        the size within the mtime granularity).
+        Returns None if the conversation does not exist.
+        """
+        try:
+            header_stat = self._get_file_path(conversation_id).stat()
+        except FileNotFoundError:
+            return None
+        try:
+            log_stat = self._get_log_path(conversation_id).stat()
+            log_stamp = (log_stat.st_ino, log_stat.st_mtime_ns, log_stat.st_size)
+        except FileNotFoundError:
+            log_stamp = (0, 0, -1)
+        return (header_stat.st_ino, header_stat.st_mtime_ns, header_stat.st_size) + log_stamp
+    
+    def _cache_get(self, conversation_id: str, stamp: Tuple[int, ...]) -> Optional[Conversation]:
+        """Return the cached conversation if its stamp matches, counting hits/misses"""
+        with self._cache_lock:
+            entry = self._cache.get(conversation_id)
+            if entry is not None and entry[0] == stamp:
+                self._cache.move_to_end(conversation_id)
+                self._cache_hits += 1
+                return entry[1]
+            self._cache_misses += 1
+            return None
+    
+    def _cache_put(self, conversation_id: str, stamp: Tuple[int, ...], conversation: Conversation) -> None:
+        """Store a conversation in the cache, evicting the least recently used entries"""
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[conversation_id] = (stamp, conversation)
+            self._cache.move_to_end(conversation_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+    
+    def _cache_invalidate(self, conversation_id: str) -> None:
+        """Drop a conversation from the cache"""
+        with self._cache_lock:
+            self._cache.pop(conversation_id, None)
+    
+    def cache_stats(self) -> dict:
+        """Conversation cache size and hit/miss counters"""
+        with self._cache_lock:
+            return {
+                "size": len(self._cache),
+                "capacity": self.cache_size,
+                "hits": self._cache_hits,
+                "misses": self._cache_misses,
+            }
+    
     def load_conversation(self, conversation_id: str) -> Optional[Conversation]:
         """
         Load a conversation from disk with file locking to prevent race conditions.
+        Unchanged conversations are served from the in-memory cache.
         Returns None if not found or error occurs.
         """
-        lock = self._get_lock(conversation_id)
-        file_path = self._get_file_path(conversation_id)
         
         try:
-            with lock:
-                if not file_path.exists():
+            with self._locks.hold(conversation_id):
+                stamp = self._file_stamp(conversation_id)
+                if stamp is None:
                     logger.warning(f"Conversation {conversation_id} not found")
                     return None
                 
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                conversation = self._cache_get(conversation_id, stamp)
+                if conversation is None:
+                    conversation = self._read_conversation(conversation_id)
+                    self._cache_put(conversation_id, stamp, conversation)
+                    logger.info(f"Loaded conversation {conversation_id}")
                 
-                conversation = Conversation(**data)
-                logger.info(f"Loaded conversation {conversation_id}")
-                return conversation
+                # Deep copy so callers can't modify the cached conversation or its messages
+                return conversation.model_copy(deep=True)
                 
         except Exception as e:
             logger.error(f"Failed to load conversation {conversation_id}: {e}")
             return None
     
+    def _read_log_window(self, conversation_id: str, start: int, end: int, message_count: int) -> List[dict]:
+        """
+        Read log records [start, end) by message index, scanning the log from
+        whichever end is closer: forward line by line, or backwards in chunks
+        from the end of the file. Caller holds the lock.
+        """
+        log_path = self._get_log_path(conversation_id)
+        if start >= end or not log_path.exists():
+            return []
+        
+        lines = []
+        if start < message_count - end:
+            with open(log_path, 'rb') as f:
+                index = 0
+                for line in f:
+                    if not line.strip():
+                        continue
+                    if index >= start:
+                        lines.append(line)
+                    index += 1
+                    if index >= end:
+                        break
+        else:
+            for line in self._iter_log_lines_reversed(conversation_id):
+                lines.append(line)
+                if len(lines) >= message_count - start:
+                    break
+            lines = lines[message_count - end:][::-1]
+        
+        records = []
+        for index, line in enumerate(lines, start):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping corrupt log line in conversation {conversation_id}")
+                continue
+            if record['message'].get('seq') is None:
+                record['message']['seq'] = index  # Logged before messages had a seq
+            records.append(record)
+        return records
+    
+    def _iter_log_lines_reversed(self, conversation_id: str) -> Iterator[bytes]:
+        """Yield the non-empty lines of a message log newest first, reading it backwards in chunks"""
+        log_path = self._get_log_path(conversation_id)
+        if not log_path.exists():
+            return
+        
+        with open(log_path, 'rb') as f:
+            position = f.seek(0, os.SEEK_END)
+            head = b""
+            while position > 0:
+                size = min(self.LOG_READ_CHUNK, position)
+                position -= size
+                f.seek(position)
+                parts = (f.read(size) + head).split(b"\n")
+                head = parts[0]  # Possibly a partial line, completed by the next chunk
+                for line in reversed(parts[1:]):
+                    if line.strip():
+                        yield line
+            if head.strip():
+                yield head
+    
+    def load_messages(
+        self,
+        conversation_id: str,
+        limit: int = 50,
+        offset: int = 0,
+        newest_first: bool = False
+    ) -> Optional[List[Message]]:
+        """
+        Load a window of messages without reading the whole conversation.
+        
+        Args:
+            conversation_id: ID of the conversation
+            limit: Maximum number of messages to return
+            offset: Number of messages to skip, counted from the oldest message
+                (or from the newest one if newest_first)
+            newest_first: Count offset from the newest message and return newest first
+            
+        Returns:
+            List of messages, or None if not found or error occurs
+        """
+        try:
+            with self._locks.hold(conversation_id):
+                stamp = self._file_stamp(conversation_id)
+                if stamp is None:
+                    logger.warning(f"Conversation {conversation_id} not found")
+                    return None
+                
+                conversation = self._cache_get(conversation_id, stamp)
+                header = self._read_header(conversation_id) if conversation is None else None
+                if conversation is None and header.get('messages'):
+                    # Legacy inline messages are not in the log yet
+                    conversation = self._read_conversation(conversation_id)
+                
+                if conversation is not None:
+                    message_count = len(conversation.messages)
+                else:
+                    message_count = self._get_log_state(conversation_id)["message_count"]
+                
+                if newest_first:
+                    start, end = message_count - offset - limit, message_count - offset
+                else:
+                    start, end = offset, offset + limit
+                start, end = max(start, 0), min(end, message_count)
+                
+                if conversation is not None:
+                    # Copies - the cached messages must not be modified by callers
+                    messages = [m.model_copy(deep=True) for m in conversation.messages[start:end]]
+                else:
+                    records = self._read_log_window(conversation_id, start, end, message_count)
+                    messages = [Message(**record['message']) for record in records]
+                
+                return messages[::-1] if newest_first else messages
+                
+        except Exception as e:
+            logger.error(f"Failed to load messages for conversation {conversation_id}: {e}")
+            return None
+    
+    def find_message_seq(self, conversation_id: str, message_id: str) -> Optional[int]:
+        """
+        Get the seq of a message by its id, searching from the newest message
+        (cursors usually point near the end). Returns None if not found.
+        """
+        try:
+            with self._locks.hold(conversation_id):
+                stamp = self._file_stamp(conversation_id)
+                if stamp is None:
+                    return None
+                
+                conversation = self._cache_get(conversation_id, stamp)
+                if conversation is None and self._read_header(conversation_id).get('messages'):
+                    conversation = self._read_conversation(conversation_id)
+                if conversation is not None:
+                    for message in reversed(conversation.messages):
+                        if message.id == message_id:
+                            return message.seq
+                    return None
+                
+                message_count = self._get_log_state(conversation_id)["message_count"]
+                needle = json.dumps(message_id, ensure_ascii=False).encode('utf-8')
+                for index, line in enumerate(self._iter_log_lines_reversed(conversation_id)):
+                    if needle not in line:
+                        continue
+                    message = json.loads(line)['message']
+                    if message['id'] == message_id:
+                        seq = message.get('seq')
+                        return seq if seq is not None else message_count - 1 - index
+                return None
+                
+        except Exception as e:
+            logger.error(f"Failed to find message {message_id} in conversation {conversation_id}: {e}")
+            return None
+    
+    def _read_conversation(self, conversation_id: str) -> Conversation:
+        """Read and validate a full conversation from header and log (caller holds the lock)"""
+        data = self._read_header(conversation_id)
+        
+        messages = data.get('messages', [])
+        # Legacy inline messages may also be in the log if a compaction
+        # was interrupted - skip duplicates by id
+        inline_ids = {m['id'] for m in messages}
+        for record in self._read_log_records(conversation_id):
+            self._apply_log_record(data, record)
+            if record['message']['id'] not in inline_ids:
+                messages.append(record['message'])
+        for seq, message in enumerate(messages):
+            if message.get('seq') is None:
+                message['seq'] = seq  # Stored before messages had a seq
+        data['messages'] = messages
+        
+        return Conversation(**data)
+    
     def list_conversations(self) -> List[ConversationMetadata]:
         """
         List all conversations with metadata (without full message history).
+        Served from the metadata index - no conversation files are read.
         Returns list sorted by updated_at (newest first).
         """
-        conversations = []
-        
         try:
-            # Find all conversation files
-            for file_path in self.base_path.glob("conversation_*.json"):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    # Extract metadata without loading all messages
-                    messages = data.get('messages', [])
-                    last_message = messages[-1] if messages else None
-                    
-                    metadata = ConversationMetadata(
-                        id=data['id'],
-                        title=data.get('title'),
-                        created_at=data['created_at'],
-                        updated_at=data['updated_at'],
-                        status=data.get('status', 'active'),
-                        message_count=len(messages),
-                        last_message_preview=last_message['content'][:100] if last_message else None
-                    )
-                    conversations.append(metadata)
-                    
-                except Exception as e:
-                    logger.error(f"Failed to load metadata from {file_path}: {e}")
-                    continue
+            conversations = [
+                ConversationMetadata(**entry)
+                for entry in self._metadata_index.values()
+            ]
             
             # Sort by updated_at (newest first)
             conversations.sort(key=lambda x: x.updated_at, reverse=True)
@@ -139,23 +753,24 @@ class StorageManager:
         Delete a conversation from disk.
         Returns True on success, False on failure.
         """
-        lock = self._get_lock(conversation_id)
-        file_path = self._get_file_path(conversation_id)
-        
         try:
-            with lock:
+            with self._locks.hold(conversation_id):
+                file_path = self._get_file_path(conversation_id)
+                log_path = self._get_log_path(conversation_id)
                 if not file_path.exists():
                     logger.warning(f"Conversation {conversation_id} not found for deletion")
                     return False
                 
                 file_path.unlink()
+                if log_path.exists():
+                    log_path.unlink()
+                self._forget_path(self.base_path, file_path.name)
+                self._log_state_drop(conversation_id)
+                self._cache_invalidate(conversation_id)
+                self._metadata_index.delete(conversation_id)
+                self._locks.discard(conversation_id)
                 logger.info(f"Deleted conversation {conversation_id}")
                 
-                # Clean up lock
-                with self._global_lock:
-                    if conversation_id in self._locks:
-                        del self._locks[conversation_id]
-                
                 return True
                 
         except Exception as e:
@@ -164,33 +779,84 @@ class StorageManager:
     
     def add_message_to_conversation(self, conversation_id: str, message: Message) -> bool:
         """
-        Add a message to an existing conversation.
+        Add a message to an existing conversation by appending it to the log.
         Returns True on success, False on failure.
         """
+        return self.add_messages_to_conversation(conversation_id, [message])
+    
+    def add_messages_to_conversation(self, conversation_id: str, messages: List[Message]) -> bool:
+        """
+        Append several messages to an existing conversation with a single
+        write and fsync (group commit).
+        Returns True on success, False on failure.
+        """
+        if not messages:
+            return True
+        
+        
         try:
-            # Load conversation
-            conversation = self.load_conversation(conversation_id)
-            if not conversation:
-                logger.error(f"Conversation {conversation_id} not found")
-                return False
-            
-            # Add message
-            conversation.messages.append(message)
-            conversation.updated_at = datetime.now()
-            
-            # Update title if it's the first user message and no title set
-            if not conversation.title and message.role == MessageRole.USER and len(conversation.messages) <= 2:
-                # Use first user message as title (truncated)
-                conversation.title = message.content[:50] + ("..." if len(message.content) > 50 else "")
-            
-            # Save conversation
-            success = self.save_conversation(conversation)
-            if success:
-                logger.info(f"Added message {message.id} to conversation {conversation_id}")
-            return success
+            with self._locks.hold(conversation_id):
+                state = self._get_log_state(conversation_id)
+                if state is None:
+                    logger.error(f"Conversation {conversation_id} not found")
+                    return False
+                
+                message_count = state["message_count"]
+                title = state["title"]
+                updated_at = datetime.now().isoformat()
+                payload = b""
+                
+                for message in messages:
+                    message.seq = message_count
+                    record = {
+                        "message": message.model_dump(mode='json'),
+                        "updated_at": updated_at,
+                    }
+                    
+                    # Update title if it's the first user message and no title set
+                    message_count += 1
+                    if not title and message.role == MessageRole.USER and message_count <= 2:
+                        # Use first user message as title (truncated)
+                        title = message.content[:50] + ("..." if len(message.content) > 50 else "")
+                        record["title"] = title
+                    
+                    payload += self._encode_log_record(record)
+                
+                # Append only the new lines - cost is independent of history length
+                with open(self._get_log_path(conversation_id), 'ab') as f:
+                    f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+                
+                state["message_count"] = message_count
+                state["title"] = title
+                state["pending"] += len(messages)
+                
+                entry = self._metadata_index.get(conversation_id)
+                if entry is None:
+                    entry = self._metadata_entry(self._read_metadata(conversation_id))
+                else:
+                    entry = dict(
+                        entry,
+                        title=title,
+                        updated_at=updated_at,
+                        message_count=message_count,
+                        last_message_preview=messages[-1].content[:100]
+                    )
+                self._metadata_index.set(conversation_id, entry)
+                
+                if state["pending"] >= self.compact_every:
+                    self._compact(conversation_id)
+                state["stamp"] = self._file_stamp(conversation_id)
+                
+                logger.info(f"Added {len(messages)} message(s) to conversation {conversation_id}")
+                self._notify_listeners(conversation_id, messages)
+                return True
             
         except Exception as e:
-            logger.error(f"Failed to add message to conversation {conversation_id}: {e}")
+            logger.error(f"Failed to add messages to conversation {conversation_id}: {e}")
+            # Force a state re-read on the next append
+            self._log_state_drop(conversation_id)
             return False
     
     def conversation_exists(self, conversation_id: str) -> bool:
@@ -202,9 +868,7 @@ class StorageManager:
     
     def _get_plan_file_path(self, plan_id: str) -> Path:
         """Get the file path for a party plan"""
-        plans_path = self.base_path.parent / "plans"
-        plans_path.mkdir(parents=True, exist_ok=True)
-        return plans_path / f"plan_{plan_id}.json"
+        return self._resolve_path(self.plans_path, plan_id, f"plan_{plan_id}.json")
     
     def save_plan(self, plan) -> bool:
         """
@@ -216,29 +880,23 @@ class StorageManager:
         Returns:
             True on success, False on failure
         """
-        lock = self._get_lock(f"plan_{plan.id}")
-        file_path = self._get_plan_file_path(plan.id)
-        temp_path = file_path.with_suffix('.tmp')
-        
         try:
-            with lock:
-                # Convert to dict for JSON serialization
+            with self._locks.hold(f"plan_{plan.id}"):
+                file_path = self._get_plan_file_path(plan.id)
+                
+                # Convert to dict for serialization
                 data = plan.model_dump(mode='json')
                 
-                # Write to temp file first
-                with open(temp_path, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+                # Write to temp file first, then rename (atomic)
+                self._write_atomic(file_path, self._serializer.dumps(data))
                 
-                # Rename temp file to actual file (atomic)
-                temp_path.replace(file_path)
+                self._plan_index.set(plan.conversation_id, plan.id)
                 
                 logger.info(f"Saved plan {plan.id}")
                 return True
                 
         except Exception as e:
             logger.error(f"Failed to save plan {plan.id}: {e}")
-            if temp_path.exists():
-                temp_path.unlink()
             return False
     
     def load_plan(self, plan_id: str):
@@ -253,17 +911,14 @@ class StorageManager:
         """
         from models import PartyPlan  # Import here to avoid circular import
         
-        lock = self._get_lock(f"plan_{plan_id}")
-        file_path = self._get_plan_file_path(plan_id)
-        
         try:
-            with lock:
+            with self._locks.hold(f"plan_{plan_id}"):
+                file_path = self._get_plan_file_path(plan_id)
                 if not file_path.exists():
                     logger.warning(f"Plan {plan_id} not found")
                     return None
                 
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                data = serializers.loads(file_path.read_bytes())
                 
                 plan = PartyPlan(**data)
                 logger.info(f"Loaded plan {plan_id}")
@@ -273,9 +928,34 @@ class StorageManager:
             logger.error(f"Failed to load plan {plan_id}: {e}")
             return None
     
+    def _scan_plan_index(self) -> dict:
+        """
+        Build the conversation_id -> plan_id index by scanning all plan files.
+        If a conversation has several plans, the most recently updated one wins.
+        """
+        index = {}
+        updated = {}
+        
+        for file_path in self.iter_files(self.plans_path, "plan"):
+            try:
+                data = serializers.loads(file_path.read_bytes())
+                
+                conversation_id = data.get('conversation_id')
+                if not conversation_id:
+                    continue
+                if conversation_id not in index or data.get('updated_at', '') > updated[conversation_id]:
+                    index[conversation_id] = data['id']
+                    updated[conversation_id] = data.get('updated_at', '')
+                    
+            except Exception as e:
+                logger.error(f"Failed to read plan from {file_path}: {e}")
+                continue
+        
+        return index
+    
     def get_plan_by_conversation(self, conversation_id: str):
         """
-        Get party plan associated with a conversation
+        Get party plan associated with a conversation (O(1) index lookup)
         
         Args:
             conversation_id: ID of the conversation
@@ -283,30 +963,20 @@ class StorageManager:
         Returns:
             PartyPlan object or None if not found
         """
-        from models import PartyPlan  # Import here to avoid circular import
-        
         try:
-            plans_path = self.base_path.parent / "plans"
-            if not plans_path.exists():
+            plan_id = self._plan_index.get(conversation_id)
+            if not plan_id:
+                logger.info(f"No plan found for conversation {conversation_id}")
                 return None
             
-            # Find plan file with matching conversation_id
-            for file_path in plans_path.glob("plan_*.json"):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    if data.get('conversation_id') == conversation_id:
-                        plan = PartyPlan(**data)
-                        logger.info(f"Found plan for conversation {conversation_id}")
-                        return plan
-                        
-                except Exception as e:
-                    logger.error(f"Failed to read plan from {file_path}: {e}")
-                    continue
+            plan = self.load_plan(plan_id)
+            if plan is None:
+                # Plan file removed outside of delete_plan - drop stale entry
+                self._plan_index.delete(conversation_id)
+                return None
             
-            logger.info(f"No plan found for conversation {conversation_id}")
-            return None
+            logger.info(f"Found plan for conversation {conversation_id}")
+            return plan
             
         except Exception as e:
             logger.error(f"Failed to get plan by conversation {conversation_id}: {e}")
@@ -322,24 +992,22 @@ class StorageManager:
         Returns:
             True on success, False on failure
         """
-        lock = self._get_lock(f"plan_{plan_id}")
-        file_path = self._get_plan_file_path(plan_id)
-        
         try:
-            with lock:
+            with self._locks.hold(f"plan_{plan_id}"):
+                file_path = self._get_plan_file_path(plan_id)
                 if not file_path.exists():
                     logger.warning(f"Plan {plan_id} not found for deletion")
                     return False
                 
+                conversation_id = serializers.loads(file_path.read_bytes()).get('conversation_id')
+                
                 file_path.unlink()
+                self._forget_path(self.plans_path, file_path.name)
+                if conversation_id and self._plan_index.get(conversation_id) == plan_id:
+                    self._plan_index.delete(conversation_id)
+                self._locks.discard(f"plan_{plan_id}")
                 logger.info(f"Deleted plan {plan_id}")
                 
-                # Clean up lock
-                with self._global_lock:
-                    lock_key = f"plan_{plan_id}"
-                    if lock_key in self._locks:
-                        del self._locks[lock_key]
-                
                 return True
                 
         except Exception as e:
@@ -350,9 +1018,7 @@ class StorageManager:
     
     def _get_task_list_file_path(self, plan_id: str) -> Path:
         """Get the file path for a task list"""
-        tasks_path = self.base_path.parent / "tasks"
-        tasks_path.mkdir(parents=True, exist_ok=True)
-        return tasks_path / f"tasks_{plan_id}.json"
+        return self._resolve_path(self.tasks_path, plan_id, f"tasks_{plan_id}.json")
     
     def save_task_list(self, tasks: list, plan_id: str, conversation_id: str = "") -> bool:
         """
@@ -368,12 +1034,10 @@ class StorageManager:
         """
         from models import TaskListStorage
         
-        lock = self._get_lock(f"tasks_{plan_id}")
-        file_path = self._get_task_list_file_path(plan_id)
-        temp_path = file_path.with_suffix('.tmp')
-        
         try:
-            with lock:
+            with self._locks.hold(f"tasks_{plan_id}"):
+                file_path = self._get_task_list_file_path(plan_id)
+                
                 # Convert Task objects to dicts
                 task_dicts = [self._task_to_dict(task) for task in tasks]
                 
@@ -386,23 +1050,17 @@ class StorageManager:
                     status="pending"
                 )
                 
-                # Convert to dict for JSON serialization
+                # Convert to dict for serialization
                 data = task_list_storage.model_dump(mode='json')
                 
-                # Write to temp file first
-                with open(temp_path, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, indent=2, ensure_ascii=False, default=str)
-                
-                # Rename temp file to actual file (atomic)
-                temp_path.replace(file_path)
+                # Write to temp file first, then rename (atomic)
+                self._write_atomic(file_path, self._serializer.dumps(data))
                 
                 logger.info(f"Saved task list for plan {plan_id} ({len(tasks)} tasks)")
                 return True
                 
         except Exception as e:
             logger.error(f"Failed to save task list for plan {plan_id}: {e}")
-            if temp_path.exists():
-                temp_path.unlink()
             return False
     
     def load_task_list(self, plan_id: str) -> Optional[list]:
@@ -415,17 +1073,14 @@ class StorageManager:
         Returns:
             List of Task objects or None if not found
         """
-        lock = self._get_lock(f"tasks_{plan_id}")
-        file_path = self._get_task_list_file_path(plan_id)
-        
         try:
-            with lock:
+            with self._locks.hold(f"tasks_{plan_id}"):
+                file_path = self._get_task_list_file_path(plan_id)
                 if not file_path.exists():
                     logger.warning(f"Task list for plan {plan_id} not found")
                     return None
                 
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                data = serializers.loads(file_path.read_bytes())
                 
                 # Extract tasks and convert back to Task objects
                 task_dicts = data.get('tasks', [])
@@ -477,8 +1132,119 @@ class StorageManager:
                 for p in data["places"]
             ]
         )
+    
+    # ===== Layout migration =====
+    
+    def _move_to_shard(self, directory: Path, key: str, file_paths: List[Path]) -> bool:
+        """
+        Move flat-layout files of one object into its shard directory.
+        The header/main file must be last, since it decides which layout is read
+        (if interrupted in between, running the migration again completes it).
+        Caller holds the object's lock.
+        """
+        target_dir = self._shard_dir(directory, key)
+        if (target_dir / file_paths[-1].name).exists():
+            logger.warning(f"{file_paths[-1].name} exists in both layouts, keeping the sharded copy")
+            return False
+        
+        target_dir.mkdir(parents=True, exist_ok=True)
+        for file_path in file_paths:
+            if file_path.exists():
+                file_path.replace(target_dir / file_path.name)  # Atomic rename
+        self._forget_path(directory, file_paths[-1].name)
+        return True
+    
+    def migrate_layout(self) -> dict:
+        """
+        Move every file of the flat layout into the sharded layout.
+        
+        Each object is moved under its own lock, so this can run while the
+        server is serving requests: in the same process, or from another
+        process when both use locking="fcntl".
+        
+        Returns:
+            Dict with number of migrated conversations, plans and task lists
+        """
+        if self.layout != "sharded":
+            raise ValueError("migrate_layout requires layout='sharded'")
+        
+        counts = {"conversations": 0, "plans": 0, "task_lists": 0}
+        
+        for file_path in list(self.base_path.glob("conversation_*.json")):
+            conversation_id = file_path.stem[len("conversation_"):]
+            with self._locks.hold(conversation_id):
+                if file_path.exists() and self._move_to_shard(
+                    self.base_path, conversation_id, [file_path.with_suffix(".log"), file_path]
+                ):
+                    counts["conversations"] += 1
+        
+        for file_path in list(self.plans_path.glob("plan_*.json")):
+            plan_id = file_path.stem[len("plan_"):]
+            with self._locks.hold(f"plan_{plan_id}"):
+                if file_path.exists() and self._move_to_shard(self.plans_path, plan_id, [file_path]):
+                    counts["plans"] += 1
+        
+        for file_path in list(self.tasks_path.glob("tasks_*.json")):
+            plan_id = file_path.stem[len("tasks_"):]
+            with self._locks.hold(f"tasks_{plan_id}"):
+                if file_path.exists() and self._move_to_shard(self.tasks_path, plan_id, [file_path]):
+                    counts["task_lists"] += 1
+        
+        logger.info(
+            f"Moved {counts['conversations']} conversations, {counts['plans']} plans "
+            f"and {counts['task_lists']} task lists to the sharded layout"
+        )
+        return counts
+
+
+def create_storage_manager():
+    """
+    Create the storage backend selected by the STORAGE_BACKEND env variable:
+    "json" (default, files under database/) or "sqlite" (STORAGE_SQLITE_PATH).
+    STORAGE_FORMAT picks the file format of the JSON backend
+    ("json-compact" default, "json" or "msgpack"), STORAGE_LOCKING its
+    locking mode ("thread" default, "fcntl" for multiple worker processes)
+    and STORAGE_LAYOUT its directory layout ("sharded" default or "flat").
+    A new SQLite database is populated once from the existing JSON files.
+    """
+    backend = os.getenv("STORAGE_BACKEND", "json").lower()
+    
+    if backend == "sqlite":
+        from sqlite_storage import SQLiteStorageManager
+        
+        db_path = Path(os.getenv("STORAGE_SQLITE_PATH", "database/storage.db"))
+        is_new = not db_path.exists()
+        manager = SQLiteStorageManager(str(db_path))
+        if is_new:
+            manager.migrate_from_json(StorageManager())
+        return manager
+    
+    if backend != "json":
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+    return StorageManager(
+        storage_format=os.getenv("STORAGE_FORMAT", "json-compact"),
+        locking=os.getenv("STORAGE_LOCKING", "thread").lower(),
+        layout=os.getenv("STORAGE_LAYOUT", "sharded").lower()
+    )
 
 
 # Global instance
-storage_manager = StorageManager()
+storage_manager = create_storage_manager()
 
+
+if __name__ == "__main__":
+    import sys
+    
+    # Usage: python storage_manager.py migrate-layout [conversations_dir]
+    # Safe to run next to a live server started with STORAGE_LOCKING=fcntl
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate-layout":
+        print("Usage: python storage_manager.py migrate-layout [conversations_dir]")
+        sys.exit(1)
+    
+    logging.basicConfig(level=logging.INFO)
+    manager = StorageManager(
+        sys.argv[2] if len(sys.argv) > 2 else "database/conversations",
+        locking=os.getenv("STORAGE_LOCKING", "thread").lower(),
+        layout="sharded"
+    )
+    print(manager.migrate_layout())
@@ -2,16 +2,196 @@
 Venue Searcher - Uses Google Search to find venues and bakeries for party planning
 """
 import re
+import os
 import json
+import asyncio
 import logging
-from typing import List, Optional
-from datetime import datetime
+import unicodedata
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+from datetime import datetime, timedelta
 
-from llm_client import LLMClient
+from llm_client import LLMCallError, LLMClient
+from llm_scheduler import BACKGROUND
 from models import Venue, VenueSearchResult
 
 logger = logging.getLogger(__name__)
 
+# "text": free-text search, parsed locally (second LLM call only if that fails)
+# "structured": one grounded call answering with JSON matching Venue - opt-in, only for
+# models that accept a response schema together with Google Search (text mode is the fallback)
+VENUE_SEARCH_MODE = os.getenv("VENUE_SEARCH_MODE", "text").lower()
+
+# "1. Nazwa - tel: +48 22 123 45 67 - www.strona.pl" (the format VENUE_SEARCH_PROMPT asks for)
+VENUE_LINE_PATTERN = re.compile(
+    r"^\s*\d+[.)]\s*(?P<name>.+?)\s*[-–—|]\s*tel(?:efon)?\.?\s*:?\s*"
+    r"(?P<phone>\+?[\d\s()./-]{9,}?)(?:\s+[-–—|]\s*(?P<website>\S.*?))?\s*$",
+    re.IGNORECASE
+)
+
+
+def parse_venue_lines(text: str, venue_type: str) -> List[Venue]:
+    """
+    Deterministic parser for the numbered "Name - tel: ... - www..." list
+    
+    Args:
+        text: LLM response text
+        venue_type: Type of venue ("restaurant", "bakery")
+        
+    Returns:
+        List of Venue objects (empty if the text is not in that format)
+    """
+    venues = []
+    for line in text.splitlines():
+        # Drop markdown emphasis and the [placeholder] brackets the model sometimes keeps
+        match = VENUE_LINE_PATTERN.match(re.sub(r"[*\[\]]", "", line))
+        if not match:
+            continue
+
+        phone = " ".join(match.group("phone").strip(" -./").split())
+        if len(re.sub(r"\D", "", phone)) < 9:
+            continue
+
+        website = (match.group("website") or "").strip().rstrip(".,;")
+        if not website or "brak" in website.lower():
+            website = None
+
+        venues.append(Venue(
+            name=match.group("name").strip(),
+            phone=phone,
+            website=website,
+            venue_type=venue_type
+        ))
+    return venues
+
+
+class VenueCache:
+    """
+    Persistent cache of parsed VenueSearchResults by (normalized location, query_type).
+    
+    Results younger than fresh_for are returned as they are. Older ones (up to
+    max_age) are still returned instantly, but refreshed in the background so
+    the next search gets current data. Only non-empty results are stored.
+    
+    search callbacks take a `refresh` flag: True for background refreshes,
+    which must bypass the LLM response cache - otherwise a cached (already
+    stale) answer would be stored again as fresh.
+    """
+
+    def __init__(
+        self,
+        path: str = "database/venue_cache.json",
+        fresh_for: timedelta = timedelta(hours=24),
+        max_age: timedelta = timedelta(days=30)
+    ):
+        """
+        Args:
+            path: JSON file with the cached results
+            fresh_for: Age after which a result is refreshed in the background
+            max_age: Age after which a result is not used at all
+        """
+        self.path = Path(path)
+        self.fresh_for = fresh_for
+        self.max_age = max_age
+        self._entries = None  # key -> VenueSearchResult (loaded on first use)
+        self._write_lock = asyncio.Lock()
+        self._refreshing = {}  # key -> asyncio.Task
+
+    @staticmethod
+    def make_key(location: str, query_type: str) -> str:
+        """Normalize case, whitespace and Polish diacritics ("Łódź " == "lodz")"""
+        def normalize(value: str) -> str:
+            value = value.replace("ł", "l").replace("Ł", "L")
+            value = unicodedata.normalize("NFKD", value)
+            value = "".join(c for c in value if not unicodedata.combining(c))
+            return " ".join(value.lower().split())
+        return f"{normalize(location)}|{normalize(query_type)}"
+
+    def _load(self) -> dict:
+        if self._entries is None:
+            self._entries = {}
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for key, data in json.load(f).items():
+                        self._entries[key] = VenueSearchResult.model_validate(data)
+                logger.info(f"Loaded {len(self._entries)} cached venue searches")
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.error(f"Failed to load venue cache {self.path}: {e}")
+        return self._entries
+
+    def _write(self, payload: dict) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    async def _store(self, key: str, result: VenueSearchResult) -> None:
+        entries = self._load()
+        entries[key] = result
+        async with self._write_lock:
+            payload = {k: v.model_dump(mode='json') for k, v in entries.items()}
+            try:
+                await asyncio.to_thread(self._write, payload)
+            except Exception as e:
+                logger.error(f"Failed to save venue cache: {e}")
+
+    async def _search_and_store(
+        self,
+        key: str,
+        search: Callable[[bool], Awaitable[VenueSearchResult]],
+        refresh: bool = False
+    ) -> VenueSearchResult:
+        result = await search(refresh)
+        if result.venues:
+            await self._store(key, result)
+        return result
+
+    def _refresh_in_background(self, key: str, search: Callable[[bool], Awaitable[VenueSearchResult]]) -> None:
+        if key in self._refreshing:
+            return
+        logger.info(f"🔄 Refreshing stale venue search in background: {key}")
+        task = asyncio.create_task(self._search_and_store(key, search, refresh=True))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def get_or_search(
+        self,
+        location: str,
+        query_type: str,
+        search: Callable[[bool], Awaitable[VenueSearchResult]]
+    ) -> VenueSearchResult:
+        """
+        Cached result for (location, query_type), or the result of search(refresh).
+        
+        Args:
+            location: City/location as given by the user
+            query_type: Searched category
+            search: Performs the actual search (refresh=True: bypass the LLM response cache)
+        """
+        key = self.make_key(location, query_type)
+        cached = self._load().get(key)
+        if cached is not None:
+            age = datetime.now() - cached.searched_at
+            if age <= self.max_age:
+                if age > self.fresh_for:
+                    self._refresh_in_background(key, search)
+                logger.info(f"💾 Venue cache hit: {key} (age {age})")
+                return cached
+
+        refreshing = self._refreshing.get(key)
+        if refreshing is not None:
+            return await asyncio.shield(refreshing)
+        return await self._search_and_store(key, search)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._load()),
+            "refreshing": len(self._refreshing)
+        }
+
 
 class VenueSearcher:
     """
@@ -36,17 +216,34 @@ Format odpowiedzi (DOKŁADNIE w tej formie):
 3. [Nazwa] - tel: [+48 XX XXX XXXX] - www.[strona]
 
 Jeśli nie ma www, użyj: "brak strony"
+"""
+
+    VENUE_SEARCH_JSON_PROMPT = """Znajdź 3 najlepsze {query_type} w {location} odpowiednie na imprezę urodzinową.
+
+WAŻNE:
+- Tylko PRAWDZIWE, ISTNIEJĄCE miejsca
+- Z aktualnymi numerami telefonów (polskie, +48, bez nawiasów kwadratowych)
+- Lokale które przyjmują rezerwacje na imprezy
+
+Dla każdego miejsca podaj: name (nazwa), phone (telefon), website (strona www lub null),
+address (adres lub null), venue_type: "{venue_type}".
 """
     
-    def __init__(self, model: str = "gemini-2.5-flash"):
+    def __init__(self, model: str = "gemini-2.5-flash", cache: Optional[VenueCache] = None):
         """
         Initialize VenueSearcher with LLM client
         
         Args:
             model: Model name to use (has Google Search tool)
+            cache: Venue cache to use (default: the global venue_cache, None if disabled)
         """
         self.model = model
-        self.llm_client = LLMClient(model=model)
+        self.cache = cache if cache is not None else venue_cache
+        # Search runs in the background lane - it must not delay users' chat turns
+        self.llm_client = LLMClient(model=model, lane=BACKGROUND)
+        # Single-call search: grounded answer constrained to JSON matching Venue
+        self.structured_output = VENUE_SEARCH_MODE == "structured"
+        self.structured_client = LLMClient(model=model, lane=BACKGROUND, response_schema=list[Venue])
         logger.info(f"VenueSearcher initialized with model {model}")
     
     async def search_venues(
@@ -57,6 +254,7 @@ Jeśli nie ma www, użyj: "brak strony"
     ) -> VenueSearchResult:
         """
         Search for venues using Google Search (ASYNC - non-blocking)
+        Results are served from venue_cache when available.
         
         Args:
             location: City/location (e.g. "Warszawa")
@@ -66,45 +264,18 @@ Jeśli nie ma www, użyj: "brak strony"
         Returns:
             VenueSearchResult with list of venues
         """
-        try:
-            logger.info(f"🔍 Searching for {count} venues: {query_type} in {location}")
-            
-            # Format the prompt
-            prompt = self.VENUE_SEARCH_PROMPT.format(
-                query_type=query_type,
-                location=location
-            )
-            
-            # ✅ ASYNC call - won't block event loop
-            logger.info(f"📡 Calling LLM with Google Search...")
-            response = await self.llm_client.send_async(prompt)
-            logger.info(f"✅ LLM responded, parsing results...")
-            
-            # ✅ Parse the response (async)
-            venues = await self._parse_search_results(response, venue_type="restaurant")
-            
-            logger.info(f"✅ Found {len(venues)} venues")
-            
-            return VenueSearchResult(
-                venues=venues[:count],  # Limit to requested count
-                location=location,
-                query_type=query_type,
-                searched_at=datetime.now()
-            )
-            
-        except Exception as e:
-            logger.error(f"❌ Failed to search venues: {e}", exc_info=True)
-            # Return empty result on error
-            return VenueSearchResult(
-                venues=[],
-                location=location,
-                query_type=query_type,
-                searched_at=datetime.now()
-            )
+        logger.info(f"🔍 Searching for {count} venues: {query_type} in {location}")
+        result = await self._cached_search(
+            location,
+            query_type,
+            lambda refresh: self._search(location, query_type, query_type, "restaurant", refresh)
+        )
+        return result.model_copy(update={"venues": result.venues[:count]})  # Limit to requested count
     
     async def search_bakeries(self, location: str, count: int = 3) -> VenueSearchResult:
         """
         Search for bakeries using Google Search (ASYNC - non-blocking)
+        Results are served from venue_cache when available.
         
         Args:
             location: City/location (e.g. "Warszawa")
@@ -113,42 +284,161 @@ Jeśli nie ma www, użyj: "brak strony"
         Returns:
             VenueSearchResult with list of bakeries
         """
-        try:
-            logger.info(f"🔍 Searching for {count} bakeries in {location}")
-            
-            # Format the prompt for bakeries
-            prompt = self.VENUE_SEARCH_PROMPT.format(
-                query_type="profesjonalne cukiernie",
-                location=location
-            )
+        logger.info(f"🔍 Searching for {count} bakeries in {location}")
+        result = await self._cached_search(
+            location,
+            "cukiernie",
+            lambda refresh: self._search(location, "profesjonalne cukiernie", "cukiernie", "bakery", refresh)
+        )
+        return result.model_copy(update={"venues": result.venues[:count]})  # Limit to requested count
+    
+    async def _cached_search(
+        self,
+        location: str,
+        query_type: str,
+        search: Callable[[bool], Awaitable[VenueSearchResult]]
+    ) -> VenueSearchResult:
+        if self.cache is None:
+            return await search(False)
+        return await self.cache.get_or_search(location, query_type, search)
+    
+    async def _search(
+        self,
+        location: str,
+        prompt_query_type: str,
+        query_type: str,
+        venue_type: str,
+        refresh: bool = False
+    ) -> VenueSearchResult:
+        """
+        Run one grounded search and parse the results (no caching)
+        
+        Args:
+            location: City/location (e.g. "Warszawa")
+            prompt_query_type: What to search for, as put into the prompt
+            query_type: Category stored in the result (e.g. "cukiernie")
+            venue_type: Venue.venue_type of the results ("restaurant", "bakery")
+            refresh: Bypass the LLM response cache for the search call
             
-            # ✅ ASYNC call - won't block event loop
-            logger.info(f"📡 Calling LLM with Google Search...")
-            response = await self.llm_client.send_async(prompt)
-            logger.info(f"✅ LLM responded, parsing results...")
+        Returns:
+            VenueSearchResult with all parsed venues (empty on error)
+        """
+        try:
+            venues = []
+            if self.structured_output:
+                venues = await self._search_structured(location, prompt_query_type, venue_type, refresh)
             
-            # ✅ Parse the response (async)
-            bakeries = await self._parse_search_results(response, venue_type="bakery")
+            if not venues:
+                # Format the prompt
+                prompt = self.VENUE_SEARCH_PROMPT.format(
+                    query_type=prompt_query_type,
+                    location=location
+                )
+                
+                # ✅ ASYNC call - won't block event loop
+                logger.info(f"📡 Calling LLM with Google Search...")
+                # Stateless: identical searches are sent once and cached (venue_search TTL)
+                response = await self.llm_client.send_stateless_async(
+                    prompt, cache_kind="venue_search", refresh=refresh
+                )
+                logger.info(f"✅ LLM responded, parsing results...")
+                
+                # Fast path: the numbered list format the prompt asks for
+                venues = parse_venue_lines(response, venue_type=venue_type)
+                if not venues:
+                    # ✅ Parse the response with the LLM (async)
+                    logger.info(f"⚠️ Unexpected result format, parsing with LLM...")
+                    venues = await self._parse_search_results(response, venue_type=venue_type)
             
-            logger.info(f"✅ Found {len(bakeries)} bakeries")
+            logger.info(f"✅ Found {len(venues)} {query_type}")
             
             return VenueSearchResult(
-                venues=bakeries[:count],  # Limit to requested count
+                venues=venues,
                 location=location,
-                query_type="cukiernie",
+                query_type=query_type,
                 searched_at=datetime.now()
             )
             
         except Exception as e:
-            logger.error(f"❌ Failed to search bakeries: {e}", exc_info=True)
+            logger.error(f"❌ Failed to search {query_type}: {e}", exc_info=True)
             # Return empty result on error
             return VenueSearchResult(
                 venues=[],
                 location=location,
-                query_type="cukiernie",
+                query_type=query_type,
                 searched_at=datetime.now()
             )
     
+    async def _search_structured(
+        self,
+        location: str,
+        query_type: str,
+        venue_type: str,
+        refresh: bool = False
+    ) -> List[Venue]:
+        """
+        Grounded search answered directly as JSON (response schema list[Venue])
+        
+        Returns:
+            List of Venue objects (empty if the call or the JSON failed)
+        """
+        prompt = self.VENUE_SEARCH_JSON_PROMPT.format(
+            query_type=query_type,
+            location=location,
+            venue_type=venue_type
+        )
+        
+        logger.info(f"📡 Calling LLM with Google Search (structured output)...")
+        try:
+            response = await self.structured_client.send_stateless_async(
+                prompt, cache_kind="venue_search", refresh=refresh
+            )
+        except LLMCallError as e:
+            if "INVALID_ARGUMENT" in str(e):
+                # Model does not support JSON output together with Google Search
+                logger.warning("⚠️ Structured venue search not supported by the model - using text mode")
+                self.structured_output = False
+            else:
+                logger.warning(f"⚠️ Structured venue search failed: {str(e)[:200]}")
+            return []
+        
+        try:
+            return self._venues_from_json(response, venue_type)
+        except (json.JSONDecodeError, AttributeError, TypeError) as e:
+            logger.warning(f"⚠️ Structured venue search returned invalid JSON: {e}")
+            return []
+    
+    def _venues_from_json(self, response: str, venue_type: str) -> List[Venue]:
+        """Convert a JSON array of {"name", "phone", "website", ...} into valid Venues"""
+        venues = []
+        
+        # Clean response - remove markdown code blocks if present
+        response = response.strip()
+        if response.startswith("```"):
+            # Remove code block markers
+            response = re.sub(r'^```(?:json)?\n', '', response)
+            response = re.sub(r'\n```$', '', response)
+            response = response.strip()
+        
+        # Convert to Venue objects
+        for item in json.loads(response):
+            venue = Venue(
+                name=(item.get("name") or "").strip(),
+                phone=(item.get("phone") or "").strip(),
+                website=item.get("website"),
+                address=item.get("address"),
+                venue_type=venue_type
+            )
+            
+            # Validate
+            if venue.name and venue.phone:
+                venues.append(venue)
+                logger.info(f"✓ Parsed venue: {venue.name} | {venue.phone}")
+            else:
+                logger.warning(f"⚠️ Skipping incomplete venue: {item}")
+        
+        return venues
+    
     async def _parse_search_results(self, text: str, venue_type: str) -> List[Venue]:
         """
         Parse LLM response to extract venue information using AI parsing (ASYNC)
@@ -183,36 +473,11 @@ WAŻNE:
 """
             
             # ✅ ASYNC call to LLM
-            parser_client = LLMClient(model=self.model)
-            response = await parser_client.send_async(parsing_prompt)
-            
-            # Clean response - remove markdown code blocks if present
-            response = response.strip()
-            if response.startswith("```"):
-                # Remove code block markers
-                response = re.sub(r'^```(?:json)?\n', '', response)
-                response = re.sub(r'\n```$', '', response)
-                response = response.strip()
+            parser_client = LLMClient(model=self.model, lane=BACKGROUND)
+            response = await parser_client.send_stateless_async(parsing_prompt, cache_kind="venue_parse")
             
             # Parse JSON
-            import json
-            parsed_data = json.loads(response)
-            
-            # Convert to Venue objects
-            for item in parsed_data:
-                venue = Venue(
-                    name=item.get("name", "").strip(),
-                    phone=item.get("phone", "").strip(),
-                    website=item.get("website"),
-                    venue_type=venue_type
-                )
-                
-                # Validate
-                if venue.name and venue.phone:
-                    venues.append(venue)
-                    logger.info(f"✓ Parsed venue: {venue.name} | {venue.phone}")
-                else:
-                    logger.warning(f"⚠️ Skipping incomplete venue: {item}")
+            venues = self._venues_from_json(response, venue_type)
             
             if not venues:
                 logger.warning(f"⚠️ No venues parsed from response.")
@@ -267,3 +532,20 @@ WAŻNE:
         
         return result.strip()
 
+
+def create_venue_cache() -> Optional[VenueCache]:
+    """
+    Create the venue cache configured by VENUE_CACHE ("on" default, "off"),
+    VENUE_CACHE_PATH, VENUE_CACHE_FRESH_HOURS and VENUE_CACHE_MAX_AGE_DAYS.
+    """
+    if os.getenv("VENUE_CACHE", "on").lower() == "off":
+        return None
+    return VenueCache(
+        path=os.getenv("VENUE_CACHE_PATH", "database/venue_cache.json"),
+        fresh_for=timedelta(hours=float(os.getenv("VENUE_CACHE_FRESH_HOURS", "24"))),
+        max_age=timedelta(days=float(os.getenv("VENUE_CACHE_MAX_AGE_DAYS", "30")))
+    )
+
+
+# Global instance (None when disabled)
+venue_cache = create_venue_cache()
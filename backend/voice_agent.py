@@ -12,6 +12,7 @@ from dotenv import load_dotenv
 
 from task import Task, Place
 from llm_client import LLMClient
+from llm_scheduler import BACKGROUND
 
 load_dotenv()
 
@@ -493,8 +494,9 @@ async def analyze_call_with_llm_async(task: Task, place: Place, transcript: str)
     # ✅ ASYNC call - won't block event loop
     try:
         print(f"🔄 Sending to LLM (gemini-2.5-flash) ASYNC...")
-        llm_client = LLMClient(model="gemini-2.5-flash")
-        response = await llm_client.send_async(prompt)
+        llm_client = LLMClient(model="gemini-2.5-flash", lane=BACKGROUND)
+        # The analysis depends only on the prompt (task, place, transcript) - cacheable
+        response = await llm_client.send_stateless_async(prompt, cache_kind="call_analysis")
         return _parse_llm_analysis(response)
         
     except Exception as e:
@@ -49,6 +49,62 @@ export const sendMessage = async (
   return response.data;
 };
 
+/**
+ * Send a message and stream the AI response (Server-Sent Events over fetch).
+ * onDelta receives response text chunks as the model generates them; resolves
+ * with the final stored assistant message (or the "processing" placeholder).
+ */
+export const sendMessageStream = async (
+  conversationId: string,
+  content: string,
+  onDelta: (text: string) => void,
+  signal?: AbortSignal
+): Promise<Message> => {
+  const response = await fetch(
+    `${api.defaults.baseURL}/chat/conversations/${conversationId}/messages/stream`,
+    {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+      body: JSON.stringify({ content }),
+      signal,
+    }
+  );
+  if (!response.ok || !response.body) {
+    throw new Error(`Failed to send message (HTTP ${response.status})`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = 'message';
+      const data: string[] = [];
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data.push(line.slice(6));
+      }
+      if (data.length === 0) continue;  // keep-alive comment
+      const payload = JSON.parse(data.join('\n'));
+
+      if (event === 'delta') onDelta(payload.text);
+      else if (event === 'done') return payload;
+      else if (event === 'error') throw new Error(payload.detail);
+    }
+  }
+  throw new Error('Stream ended before the response was complete');
+};
+
 /**
  * Delete a conversation
  */
@@ -58,15 +114,34 @@ export const deleteConversation = async (conversationId: string): Promise<void>
 
 /**
  * Get messages from a conversation with pagination
+ * (newestFirst: offset counts from the newest message, results newest first)
  */
 export const getMessages = async (
   conversationId: string,
   limit = 50,
-  offset = 0
+  offset = 0,
+  newestFirst = false
 ): Promise<Message[]> => {
   const response = await api.get<Message[]>(
     `/chat/conversations/${conversationId}/messages`,
-    { params: { limit, offset } }
+    { params: { limit, offset, newest_first: newestFirst } }
+  );
+  return response.data;
+};
+
+/**
+ * Long-poll for messages newer than a cursor: resolves as soon as there are new
+ * messages, or with an empty list after `timeout` seconds
+ */
+export const waitForMessages = async (
+  conversationId: string,
+  after: number | string,
+  timeout = 25,
+  signal?: AbortSignal
+): Promise<Message[]> => {
+  const response = await api.get<Message[]>(
+    `/chat/conversations/${conversationId}/wait`,
+    { params: { after, timeout }, signal }
   );
   return response.data;
 };
@@ -76,7 +151,9 @@ export default {
   getConversations,
   getConversation,
   sendMessage,
+  sendMessageStream,
   deleteConversation,
   getMessages,
+  waitForMessages,
 };
 
@@ -3,6 +3,7 @@ export interface Message {
   role: 'user' | 'assistant';
   content: string;
   timestamp: string;
+  seq?: number;  // Position in the conversation, assigned by the backend (absent on optimistic messages)
   metadata?: {
     step?: string;
     error?: boolean;
@@ -1,7 +1,7 @@
 "use client";
 
 import React, { useState, useEffect, useRef } from 'react';
-import { sendMessage as sendMessageApi, createConversation, getConversations, getConversation } from '@/api/chatApi';
+import { sendMessageStream, createConversation, getConversations, getConversation, waitForMessages } from '@/api/chatApi';
 import type { Message } from '@/api/types';
 import { Button } from '@/components/ui/button';
 import { Textarea } from '@/components/ui/textarea';
@@ -19,10 +19,12 @@ export function ChatWindow() {
   const [error, setError] = useState<string | null>(null);
   const [conversationId, setConversationId] = useState<string | null>(null);
   const [isSearching, setIsSearching] = useState(false);
+  const [isStreaming, setIsStreaming] = useState(false);  // Response text is arriving token by token
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const inputRef = useRef<HTMLTextAreaElement>(null);
   const initialized = useRef(false);
-  const autoRefreshInterval = useRef<NodeJS.Timeout | null>(null);
+  const lastSeq = useRef(-1);  // Newest stored message seq - cursor for delta polling
+  const messageCount = useRef(0);  // messages.length for the polling loop (not an effect dependency)
 
   // Initialize - load existing conversation or prepare for new one
   useEffect(() => {
@@ -51,6 +53,16 @@ export function ChatWindow() {
     scrollToBottom();
   }, [messages]);
 
+  // Keep the polling cursor at the newest stored message
+  useEffect(() => {
+    messageCount.current = messages.length;
+    for (const message of messages) {
+      if (message.seq !== undefined && message.seq > lastSeq.current) {
+        lastSeq.current = message.seq;
+      }
+    }
+  }, [messages]);
+
   // Auto-refresh conversation when backend is processing
   useEffect(() => {
     if (!isSearching || !conversationId) {
@@ -58,88 +70,107 @@ export function ChatWindow() {
     }
 
     console.log('🔄 Starting auto-refresh for conversation:', conversationId);
-    console.log('📊 Current messages count:', messages.length);
+    console.log('📊 Current messages count:', messageCount.current);
     
     let refreshCount = 0;
-    let previousMessageCount = messages.length;
+    let previousMessageCount = messageCount.current;
+    const startedAt = Date.now();
+    const controller = new AbortController();
     
-    const intervalId = setInterval(async () => {
-      try {
-        refreshCount++;
-        console.log('─────────────────────────────────────');
-        console.log(`🔄 Auto-refresh #${refreshCount}`);
-        console.log(`   Conversation: ${conversationId}`);
-        console.log(`   Current messages: ${messages.length}`);
-        console.log(`   Fetching GET /conversations/${conversationId}...`);
+    const stop = () => {
+      setIsLoading(false);
+      setIsSearching(false);
+    };
+    
+    // Long-poll loop: each request is held open by the backend until a new
+    // message arrives (or 25s pass), so updates show up immediately
+    const poll = async () => {
+      while (!controller.signal.aborted) {
+        try {
+          refreshCount++;
+          console.log('─────────────────────────────────────');
+          console.log(`🔄 Auto-refresh #${refreshCount}`);
+          console.log(`   Conversation: ${conversationId}`);
+          console.log(`   Current messages: ${messageCount.current}`);
         
-        const startFetch = Date.now();
-        const conv = await getConversation(conversationId);
-        const fetchDuration = Date.now() - startFetch;
-        console.log(`📥 Received conversation in ${fetchDuration}ms`);
-        console.log(`   Messages in response: ${conv.messages.length}`);
+          // Wait only for messages newer than the cursor - not the whole conversation
+          const cursor = lastSeq.current;
+          console.log(`   Waiting on GET /conversations/${conversationId}/wait?after=${cursor}...`);
         
-        // ALWAYS update messages in state - to jest kluczowe!
-        setMessages(conv.messages);
+          const startFetch = Date.now();
+          const newMessages = await waitForMessages(conversationId, cursor, 25, controller.signal);
+          const fetchDuration = Date.now() - startFetch;
+          console.log(`📥 Received ${newMessages.length} new message(s) after ${fetchDuration}ms`);
         
-        // Check if we got NEW messages
-        if (conv.messages.length > previousMessageCount) {
-          console.log(`✨ New messages detected! (${previousMessageCount} -> ${conv.messages.length})`);
-          previousMessageCount = conv.messages.length;
+          // Check if we got NEW messages
+          if (newMessages.length > 0) {
+            const lastMessage = newMessages[newMessages.length - 1];
+            lastSeq.current = Math.max(cursor, lastMessage.seq ?? cursor);
           
-          const lastMessage = conv.messages[conv.messages.length - 1];
-          console.log('📨 Last message:', { role: lastMessage.role, preview: lastMessage.content.substring(0, 50) });
+            setMessages(prev => {
+              const known = new Set(prev.map(m => m.id));
+              // The stored user message replaces the optimistic one (which has no seq)
+              const kept = newMessages.some(m => m.role === 'user')
+                ? prev.filter(m => m.seq !== undefined || m.role !== 'user')
+                : prev;
+              return [...kept, ...newMessages.filter(m => !known.has(m.id))];
+            });
           
-          // ✅ Backend tells us explicitly whether to continue refreshing
-          if (lastMessage.role === 'assistant') {
-            const metadata = lastMessage.metadata || {};
+            console.log(`✨ New messages detected! (${previousMessageCount} -> ${previousMessageCount + newMessages.length})`);
+            previousMessageCount += newMessages.length;
+          
+            console.log('📨 Last message:', { role: lastMessage.role, preview: lastMessage.content.substring(0, 50) });
+          
+            // ✅ Backend tells us explicitly whether to continue refreshing
+            if (lastMessage.role === 'assistant') {
+              const metadata = lastMessage.metadata || {};
             
-            // Check the explicit flag from backend
-            const shouldContinue = metadata.should_continue_refresh;
+              // Check the explicit flag from backend
+              const shouldContinue = metadata.should_continue_refresh;
             
-            if (shouldContinue === false) {
-              console.log('✅ Backend says: STOP auto-refresh (waiting for user input)');
-              console.log('   Step:', metadata.step || 'unknown');
-              console.log('   Metadata:', metadata);
-              setIsLoading(false);
-              setIsSearching(false);
-              clearInterval(intervalId);
-              return;
-            } else if (shouldContinue === true) {
-              console.log('📨 Backend says: CONTINUE auto-refresh (more messages coming)');
-              console.log('   Step:', metadata.step || 'unknown');
-            } else {
-              // Fallback if flag not set - assume we should CONTINUE
-              // (backend might not always set this flag, especially during processing)
-              console.log('⚠️ No should_continue_refresh flag - assuming CONTINUE (backend still processing)');
-              console.log('   Message preview:', lastMessage.content.substring(0, 100));
-              // Keep refreshing
+              if (shouldContinue === false) {
+                console.log('✅ Backend says: STOP auto-refresh (waiting for user input)');
+                console.log('   Step:', metadata.step || 'unknown');
+                console.log('   Metadata:', metadata);
+                stop();
+                return;
+              } else if (shouldContinue === true) {
+                console.log('📨 Backend says: CONTINUE auto-refresh (more messages coming)');
+                console.log('   Step:', metadata.step || 'unknown');
+              } else {
+                // Fallback if flag not set - assume we should CONTINUE
+                // (backend might not always set this flag, especially during processing)
+                console.log('⚠️ No should_continue_refresh flag - assuming CONTINUE (backend still processing)');
+                console.log('   Message preview:', lastMessage.content.substring(0, 100));
+                // Keep refreshing
+              }
             }
+          } else {
+            console.log('⏳ No new messages yet, continuing to poll...');
           }
-        } else {
-          console.log('⏳ No new messages yet, continuing to poll...');
-        }
         
-        // Safety timeout: 2 minutes (24 * 5 seconds = 120 seconds)
-        if (refreshCount > 24) {
-          console.log('⏱️ Auto-refresh timeout after 2 minutes');
-          setIsLoading(false);
-          setIsSearching(false);
-          clearInterval(intervalId);
+          // Safety timeout: 2 minutes without the backend finishing
+          if (Date.now() - startedAt > 120000) {
+            console.log('⏱️ Auto-refresh timeout after 2 minutes');
+            stop();
+            return;
+          }
+        } catch (err) {
+          if (controller.signal.aborted) return;
+          console.error('❌ Auto-refresh failed:', err);
+          // Back off before retrying so a down backend is not hammered
+          await new Promise(resolve => setTimeout(resolve, 5000));
         }
-      } catch (err) {
-        console.error('❌ Auto-refresh failed:', err);
       }
-    }, 5000); // Refresh every 5 seconds (reduced from 2s to avoid race conditions)
-
-    autoRefreshInterval.current = intervalId;
+    };
+    
+    poll();
 
     return () => {
       console.log('⏹️ Cleanup: stopping auto-refresh');
-      if (intervalId) {
-        clearInterval(intervalId);
-      }
+      controller.abort();
     };
-  }, [isSearching, conversationId, messages.length]);
+  }, [isSearching, conversationId]);
 
   // Focus input on mount
   useEffect(() => {
@@ -228,15 +259,36 @@ export function ChatWindow() {
       // Send the message (this triggers backend processing)
       console.log('──────────────────────────────────────');
       console.log('Step 4: POST to backend');
-      console.log('⏳ Calling sendMessageApi()...');
-      console.log('   URL: POST /api/chat/conversations/' + convId + '/messages');
+      console.log('⏳ Calling sendMessageStream()...');
+      console.log('   URL: POST /api/chat/conversations/' + convId + '/messages/stream');
       console.log('   Payload: { content: "' + messageContent + '" }');
       const startTime = Date.now();
       
-      await sendMessageApi(convId, messageContent);
+      // Show the response while it is generated: a temporary assistant message
+      // (no seq) grows with every chunk and is replaced by the stored message
+      const streamId = `stream-${Date.now()}`;
+      const finalMessage = await sendMessageStream(convId, messageContent, (text) => {
+        setIsStreaming(true);
+        setMessages(prev => {
+          const streamed = prev.find(m => m.id === streamId);
+          if (!streamed) {
+            return [...prev, { id: streamId, role: 'assistant', content: text, timestamp: new Date().toISOString() }];
+          }
+          return prev.map(m => m.id === streamId ? { ...m, content: m.content + text } : m);
+        });
+      });
+      setIsStreaming(false);
+      setMessages(prev => {
+        const rest = prev.filter(m => m.id !== streamId);
+        // "processing" means the messages are saved in the background - long-poll delivers them
+        if (finalMessage.id === 'processing' || rest.some(m => m.id === finalMessage.id)) {
+          return rest;
+        }
+        return [...rest, finalMessage];
+      });
       
       const duration = Date.now() - startTime;
-      console.log(`✅ sendMessageApi() completed in ${duration}ms`);
+      console.log(`✅ sendMessageStream() completed in ${duration}ms`);
       console.log('──────────────────────────────────────');
       console.log('✅ SUCCESS - message sent!');
       console.log('🔄 Auto-refresh is active and will poll every 5s');
@@ -270,13 +322,14 @@ export function ChatWindow() {
       
       setError(`Error: ${err.response?.data?.detail || err.message || 'Failed to send message'}`);
       // Remove optimistic user message on error
-      setMessages(prev => prev.filter(msg => msg.id !== userMessage.id));
+      setMessages(prev => prev.filter(msg => msg.id !== userMessage.id && !msg.id.startsWith('stream-')));
       console.log('✅ Removed optimistic message from UI');
       // Restore input value
       setInputValue(messageContent);
       console.log('✅ Restored input value');
       setIsLoading(false);
       setIsSearching(false);
+      setIsStreaming(false);
       console.log('✅ State reset: isLoading=false, isSearching=false');
     }
   };
@@ -369,7 +422,7 @@ export function ChatWindow() {
               }
             })}
 
-            {isLoading && (
+            {isLoading && !isStreaming && (
               <div className="flex justify-start gap-3 animate-in fade-in-0 slide-in-from-bottom-2 duration-300">
                 <div className="flex-shrink-0 w-8 h-8 rounded-full bg-[#2a2a2a] border border-white/[0.08] flex items-center justify-center text-neutral-400 font-semibold text-sm">
                   AI
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Test for LLMScheduler lanes: background calls can never occupy every slot,
+so an interactive call starts at once while the background lane is saturated.
+Run with: python tests/test_llm_scheduler.py
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.append(str(BACKEND_DIR))
+
+from llm_scheduler import LLMScheduler, INTERACTIVE, BACKGROUND
+
+
+async def saturate_background(scheduler: LLMScheduler, release: asyncio.Event) -> list:
+    """Start more background calls than there are slots; they hold them until release"""
+    async def background_call():
+        async with scheduler.slot(BACKGROUND):
+            await release.wait()
+
+    tasks = [asyncio.create_task(background_call()) for _ in range(scheduler.max_concurrency + 2)]
+    await asyncio.sleep(0.05)
+    return tasks
+
+
+async def check_interactive_headroom(max_concurrency: int, max_background: int) -> None:
+    scheduler = LLMScheduler(max_concurrency=max_concurrency, max_background=max_background)
+    assert scheduler.max_background < max_concurrency, \
+        f"max_background={scheduler.max_background} leaves no interactive slot"
+
+    release = asyncio.Event()
+    tasks = await saturate_background(scheduler, release)
+    lanes = scheduler.stats()["lanes"]
+    assert lanes[BACKGROUND]["running"] == scheduler.max_background
+    assert lanes[BACKGROUND]["queued"] > 0, "Background lane is not saturated"
+
+    async def interactive_call():
+        async with scheduler.slot(INTERACTIVE):
+            return True
+
+    # Must not wait for any background call to finish
+    assert await asyncio.wait_for(interactive_call(), 1.0)
+    print(
+        f"✅ max_concurrency={max_concurrency}, LLM_MAX_BACKGROUND={max_background}: "
+        f"interactive call started with {scheduler.max_background} background calls running"
+    )
+
+    release.set()
+    await asyncio.gather(*tasks)
+
+
+def test_interactive_headroom() -> None:
+    print("🧪 Testing interactive headroom of the LLM scheduler\n")
+    for max_concurrency, max_background in [(8, 4), (4, 4), (4, 10), (2, 2)]:
+        asyncio.run(check_interactive_headroom(max_concurrency, max_background))
+
+
+def test_single_slot_is_shared() -> None:
+    scheduler = LLMScheduler(max_concurrency=1, max_background=4)
+    assert scheduler.max_background == 1, "Background calls could never run with one slot"
+    print("✅ max_concurrency=1: the single slot is shared by both lanes")
+
+
+if __name__ == "__main__":
+    try:
+        test_interactive_headroom()
+        test_single_slot_is_shared()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        print("\n❌ SOME CHECKS FAILED")
+        sys.exit(1)
+    print("\n✅ ALL CHECKS PASSED")
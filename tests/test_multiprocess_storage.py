@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Stress test for STORAGE_LOCKING=fcntl: several processes append to the same
+conversations and save plans concurrently, then we check nothing was lost.
+Run with: python tests/test_multiprocess_storage.py
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.append(str(BACKEND_DIR))
+
+NUM_PROCESSES = 4
+MESSAGES_PER_PROCESS = 60
+COMPACT_EVERY = 8  # Small, so compactions race with appends from other processes
+
+
+def writer(workdir: str, worker_id: int, conversation_ids: list, start_event) -> None:
+    """Append messages from one process (runs in a separate interpreter)"""
+    os.chdir(workdir)  # The storage_manager module creates its global instance in cwd
+    from models import Message, MessageRole, PartyPlan, PlanState
+    from storage_manager import StorageManager
+
+    storage = StorageManager(
+        base_path=os.path.join(workdir, "database", "conversations"),
+        compact_every=COMPACT_EVERY,
+        locking="fcntl"
+    )
+    start_event.wait()
+
+    for i in range(MESSAGES_PER_PROCESS):
+        conversation_id = conversation_ids[i % len(conversation_ids)]
+        message = Message(
+            id=f"w{worker_id}-{i}",
+            conversation_id=conversation_id,
+            role=MessageRole.USER if i % 2 == 0 else MessageRole.ASSISTANT,
+            content=f"worker {worker_id} message {i}",
+            timestamp=datetime.now()
+        )
+        if not storage.add_message_to_conversation(conversation_id, message):
+            raise RuntimeError(f"Worker {worker_id} failed to append message {i}")
+
+        if i % 10 == 0:
+            now = datetime.now()
+            plan = PartyPlan(
+                id=f"plan-w{worker_id}-{i}",
+                conversation_id=conversation_ids[0],
+                user_request=f"stress plan {i}",
+                state=PlanState.PLANNING,
+                created_at=now,
+                updated_at=now
+            )
+            if not storage.save_plan(plan):
+                raise RuntimeError(f"Worker {worker_id} failed to save plan {i}")
+
+
+def test_multiprocess_storage() -> None:
+    print("🧪 Testing cross-process storage locking (fcntl)\n")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            from models import Conversation
+            from storage_manager import StorageManager
+
+            base_path = os.path.join(workdir, "database", "conversations")
+            storage = StorageManager(base_path=base_path, compact_every=COMPACT_EVERY, locking="fcntl")
+
+            conversation_ids = []
+            for n in range(2):
+                now = datetime.now()
+                conversation = Conversation(id=f"stress-{n}", created_at=now, updated_at=now)
+                storage.save_conversation(conversation)
+                conversation_ids.append(conversation.id)
+
+            ctx = multiprocessing.get_context("spawn")
+            start_event = ctx.Event()
+            processes = [
+                ctx.Process(target=writer, args=(workdir, worker_id, conversation_ids, start_event))
+                for worker_id in range(NUM_PROCESSES)
+            ]
+            for process in processes:
+                process.start()
+
+            time.sleep(2)  # Let every worker finish importing before they start writing
+            start = time.time()
+            start_event.set()
+            for process in processes:
+                process.join()
+            elapsed = time.time() - start
+
+            assert all(process.exitcode == 0 for process in processes), "A writer process failed"
+            print(f"✅ {NUM_PROCESSES} processes wrote {NUM_PROCESSES * MESSAGES_PER_PROCESS} messages in {elapsed:.2f}s")
+
+            fresh = StorageManager(base_path=base_path, locking="fcntl")
+            listed = {meta.id: meta for meta in storage.list_conversations()}
+
+            for index, conversation_id in enumerate(conversation_ids):
+                expected_ids = [
+                    f"w{worker_id}-{i}"
+                    for worker_id in range(NUM_PROCESSES)
+                    for i in range(MESSAGES_PER_PROCESS)
+                    if i % len(conversation_ids) == index
+                ]
+                conversation = fresh.load_conversation(conversation_id)
+                message_ids = [m.id for m in conversation.messages]
+
+                missing = set(expected_ids) - set(message_ids)
+                duplicates = len(message_ids) - len(set(message_ids))
+                assert sorted(message_ids) == sorted(expected_ids), \
+                    f"{conversation_id}: {len(missing)} missing, {duplicates} duplicated messages"
+
+                # Every process's messages must keep their relative order
+                for worker_id in range(NUM_PROCESSES):
+                    own = [m for m in message_ids if m.startswith(f"w{worker_id}-")]
+                    assert own == [m for m in expected_ids if m.startswith(f"w{worker_id}-")], \
+                        f"{conversation_id}: messages of worker {worker_id} out of order"
+
+                # Metadata index (maintained incrementally by all processes) must agree
+                assert listed[conversation_id].message_count == len(expected_ids), (
+                    f"{conversation_id}: index says {listed[conversation_id].message_count} "
+                    f"messages, expected {len(expected_ids)}"
+                )
+                print(f"✅ {conversation_id}: {len(expected_ids)} messages, index consistent")
+
+            plan = storage.get_plan_by_conversation(conversation_ids[0])
+            assert plan is not None, "Plan index lost the conversation's plan"
+            print(f"✅ Plan index resolves to {plan.id}")
+        finally:
+            os.chdir(BACKEND_DIR)
+
+
+if __name__ == "__main__":
+    try:
+        test_multiprocess_storage()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        print("\n❌ SOME CHECKS FAILED")
+        sys.exit(1)
+    print("\n✅ ALL CHECKS PASSED")